@@ -2,7 +2,11 @@ from langchain.agents import create_agent
 from langchain.chat_models import init_chat_model
 
 from app.config import get_settings
+from app.context_cache import ContextCache, PrefixCacheMiddleware, get_tool_schemas
+from app.executor import get_tool_executor
+from app.logger import logger
 from app.prompt import prompt
+from app.tool_selection import ToolSelectionMiddleware
 from app.tools import get_tools
 
 settings = get_settings()
@@ -14,8 +18,34 @@ model = init_chat_model(
     api_key=settings.google_api_key
 )
 
+tools = get_tool_executor().wrap_tools(get_tools())
+
+# Provider-side caching of the system prompt and tool declarations is only
+# available for Gemini. The cache is created lazily on the first model call.
+context_cache = None
+if settings.context_cache and settings.model_provider == "google_genai":
+    context_cache = ContextCache(
+        get_tool_schemas(tuple(tools)), settings.context_cache_ttl
+    )
+
+# A cached prefix holds every tool declaration, so a per-request subset can't
+# be sent alongside it; the cache wins when both are enabled.
+use_tool_selection = settings.tool_selection
+if use_tool_selection and context_cache is not None:
+    logger.warning(
+        "TOOL_SELECTION is ignored while CONTEXT_CACHE is enabled: the cached "
+        "prompt already declares all tools."
+    )
+    use_tool_selection = False
+
+# Tool selection must run first: the prefix middleware swaps the selected tools
+# for their precomputed schemas.
+middleware = [ToolSelectionMiddleware()] if use_tool_selection else []
+middleware.append(PrefixCacheMiddleware(tools, context_cache))
+
 agent = create_agent(
     model=model,
-    tools=get_tools(),
+    tools=tools,
     system_prompt=prompt,
+    middleware=middleware,
 )
@@ -0,0 +1,235 @@
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Iterable
+
+import numpy as np
+
+from app.google_calendar import iter_events
+
+DAY = 86400
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+
+@dataclass
+class EventArrays:
+    """
+    Events as columns, one row per event.
+    Times are epoch seconds; utc_offset holds each event's own offset so that
+    weekdays and dates are those the event was scheduled in. Attendance is a
+    sparse list of (event row, person index) pairs.
+    """
+
+    start: np.ndarray
+    end: np.ndarray
+    utc_offset: np.ndarray
+    all_day: np.ndarray
+    calendar: np.ndarray
+    calendar_ids: list[str]
+    attendee_event: np.ndarray
+    attendee_person: np.ndarray
+    people: list[str]
+
+    def __len__(self) -> int:
+        return len(self.start)
+
+    @property
+    def duration(self) -> np.ndarray:
+        return self.end - self.start
+
+    @property
+    def local_day(self) -> np.ndarray:
+        """Days since the epoch in each event's own time zone."""
+        return (self.start + self.utc_offset) // DAY
+
+
+def _parse(info: dict) -> tuple[float, float, bool]:
+    if "dateTime" in info:
+        value = datetime.datetime.fromisoformat(info["dateTime"])
+        offset = value.utcoffset()
+        return value.timestamp(), offset.total_seconds() if offset else 0.0, False
+    # All-day events have no time zone; treat the date as UTC midnight so
+    # that local_day is the date itself.
+    value = datetime.datetime.fromisoformat(info["date"]).replace(tzinfo=datetime.UTC)
+    return value.timestamp(), 0.0, True
+
+
+def load_event_arrays(events_by_calendar: dict[str, Iterable[dict]]) -> EventArrays:
+    """Converts API events, keyed by calendar ID, into columnar arrays."""
+    starts, ends, offsets, all_day, calendars = [], [], [], [], []
+    attendee_event, attendee_person = [], []
+    people: dict[str, int] = {}
+    calendar_ids = list(events_by_calendar)
+    for calendar_index, events in enumerate(events_by_calendar.values()):
+        for event in events:
+            start, offset, is_all_day = _parse(event["start"])
+            end, _, _ = _parse(event["end"])
+            row = len(starts)
+            starts.append(start)
+            ends.append(end)
+            offsets.append(offset)
+            all_day.append(is_all_day)
+            calendars.append(calendar_index)
+            for attendee in event.get("attendees", []):
+                # The user and meeting rooms attend everything they're on.
+                if attendee.get("self") or attendee.get("resource"):
+                    continue
+                email = attendee.get("email")
+                if email:
+                    attendee_event.append(row)
+                    attendee_person.append(people.setdefault(email, len(people)))
+    return EventArrays(
+        start=np.array(starts, dtype=np.float64),
+        end=np.array(ends, dtype=np.float64),
+        utc_offset=np.array(offsets, dtype=np.float64),
+        all_day=np.array(all_day, dtype=bool),
+        calendar=np.array(calendars, dtype=np.intp),
+        calendar_ids=calendar_ids,
+        attendee_event=np.array(attendee_event, dtype=np.intp),
+        attendee_person=np.array(attendee_person, dtype=np.intp),
+        people=list(people),
+    )
+
+
+def fetch_event_arrays(
+    calendar_ids: list[str], days: int, user_id: str | None = None
+) -> EventArrays:
+    """
+    Fetches the past `days` days of events from each calendar.
+    API errors are raised, so a failed fetch isn't summarised as a free calendar.
+    """
+    end = datetime.datetime.now(tz=datetime.UTC)
+    start = end - datetime.timedelta(days=days)
+
+    def fetch(calendar_id: str) -> list[dict]:
+        return list(
+            iter_events(
+                calendar_id,
+                time_min=start,
+                time_max=end,
+                page_size=2500,
+                user_id=user_id,
+                raise_errors=True,
+            )
+        )
+
+    with ThreadPoolExecutor(4, thread_name_prefix="analytics") as pool:
+        events = pool.map(fetch, calendar_ids)
+        return load_event_arrays(dict(zip(calendar_ids, events)))
+
+
+def _date(day: int) -> str:
+    return datetime.date.fromordinal(datetime.date(1970, 1, 1).toordinal() + day).isoformat()
+
+
+def _top(values: np.ndarray, top: int) -> np.ndarray:
+    """Indices of the `top` largest non-zero values, largest first."""
+    order = np.argsort(values, kind="stable")[::-1][:top]
+    return order[values[order] > 0]
+
+
+def summarize(arrays: EventArrays, top: int = 5) -> dict:
+    """
+    Aggregates events into meeting statistics.
+    Hours only count timed events; all-day events are counted separately.
+    """
+    timed = ~arrays.all_day
+    hours = arrays.duration[timed] / 3600
+    days = arrays.local_day[timed].astype(np.int64)
+    summary: dict = {
+        "events": len(arrays),
+        "timed_events": int(timed.sum()),
+        "all_day_events": int(arrays.all_day.sum()),
+        "total_hours": float(hours.sum()),
+        "average_hours": float(hours.mean()) if len(hours) else 0.0,
+        "median_hours": float(np.median(hours)) if len(hours) else 0.0,
+    }
+
+    # 1970-01-01 was a Thursday, so Monday-based weekdays and weeks are
+    # offset by three days.
+    weekday_hours = np.bincount((days + 3) % 7, weights=hours, minlength=7)
+    summary["weekday_hours"] = {
+        WEEKDAYS[i]: float(weekday_hours[i]) for i in _top(weekday_hours, 7)
+    }
+
+    weeks = (days + 3) // 7
+    if len(weeks):
+        # Weeks without meetings count towards the average too.
+        week_hours = np.bincount(weeks - weeks.min(), weights=hours)
+        summary["weekly_hours"] = {
+            "average": float(week_hours.mean()),
+            "max": float(week_hours.max()),
+            "weeks": len(week_hours),
+        }
+    else:
+        summary["weekly_hours"] = {"average": 0.0, "max": 0.0, "weeks": 0}
+
+    unique_days, day_index = np.unique(days, return_inverse=True)
+    day_hours = np.bincount(day_index, weights=hours, minlength=len(unique_days))
+    summary["busiest_dates"] = {
+        _date(int(unique_days[i])): float(day_hours[i]) for i in _top(day_hours, top)
+    }
+
+    calendar_hours = np.bincount(
+        arrays.calendar[timed], weights=hours, minlength=len(arrays.calendar_ids)
+    )
+    summary["calendar_hours"] = {
+        calendar_id: float(calendar_hours[i])
+        for i, calendar_id in enumerate(arrays.calendar_ids)
+    }
+
+    summary["top_attendees"], summary["attendee_overlap"] = _attendees(arrays, top)
+    return summary
+
+
+def _attendees(arrays: EventArrays, top: int) -> tuple[dict, dict]:
+    meetings = np.bincount(arrays.attendee_person, minlength=len(arrays.people))
+    top_people = _top(meetings, top)
+    attendees = {arrays.people[i]: int(meetings[i]) for i in top_people}
+    if len(top_people) < 2:
+        return attendees, {}
+
+    # Event-by-person incidence matrix over the top attendees; M.T @ M counts
+    # the events each pair attended together.
+    column = np.full(len(arrays.people), -1, dtype=np.intp)
+    column[top_people] = np.arange(len(top_people))
+    keep = column[arrays.attendee_person] >= 0
+    incidence = np.zeros((len(arrays), len(top_people)), dtype=np.int32)
+    incidence[arrays.attendee_event[keep], column[arrays.attendee_person[keep]]] = 1
+    together = incidence.T @ incidence
+
+    first, second = np.triu_indices(len(top_people), k=1)
+    shared = together[first, second]
+    overlap = {}
+    for i in _top(shared, top):
+        pair = f"{arrays.people[top_people[first[i]]]} & {arrays.people[top_people[second[i]]]}"
+        overlap[pair] = int(shared[i])
+    return attendees, overlap
+
+
+def format_summary(summary: dict, days: int) -> str:
+    """Formats a summary compactly for the agent."""
+    if not summary["events"]:
+        return f"No events in the last {days} days."
+    weekly = summary["weekly_hours"]
+    lines = [
+        f"Calendar analytics for the last {days} days:",
+        f"• {summary['timed_events']} meetings totalling {summary['total_hours']:.1f} hours"
+        f" ({summary['all_day_events']} all-day events not counted)",
+        f"• Average meeting {summary['average_hours'] * 60:.0f} min,"
+        f" median {summary['median_hours'] * 60:.0f} min",
+        f"• {weekly['average']:.1f} hours per week on average,"
+        f" {weekly['max']:.1f} in the busiest week",
+    ]
+    sections = [
+        ("Hours by weekday", summary["weekday_hours"], "{:.1f} h"),
+        ("Busiest dates", summary["busiest_dates"], "{:.1f} h"),
+        ("Hours by calendar", summary["calendar_hours"], "{:.1f} h"),
+        ("Most frequent attendees", summary["top_attendees"], "{} meetings"),
+        ("Attendees most often together", summary["attendee_overlap"], "{} meetings"),
+    ]
+    for title, values, unit in sections:
+        if values:
+            items = ", ".join(f"{key} {unit.format(value)}" for key, value in values.items())
+            lines.append(f"• {title}: {items}")
+    return "\n".join(lines)
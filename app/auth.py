@@ -1,57 +1,127 @@
+import json
+import threading
+
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow  # type: ignore
 
 from app.config import get_settings
+from app.credential_store import get_credential_store
 
 settings = get_settings()
 
+_user_locks: dict[str | None, threading.RLock] = {}
+_user_locks_lock = threading.Lock()
 
-def authenticate():
-    """Handles user authentication for the Google Calendar API."""
-    creds = None
-    # The file token.json stores the user's access and refresh tokens, and is
-    # created automatically when the authorization flow completes for the first
-    # time.
-    if settings.token_file.exists():
-        creds = Credentials.from_authorized_user_file(
-            settings.token_file, settings.scopes
-        )
-    # If there are no (valid) credentials available, let the user log in.
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            flow = InstalledAppFlow.from_client_secrets_file(
-                settings.credentials_file, settings.scopes
+
+def user_lock(user_id: str | None) -> threading.RLock:
+    """
+    Returns the lock guarding token loads and refreshes for a user.
+    It is reentrant, so a caller holding it (e.g. the client pool while it
+    builds a client) can still call authenticate() or load_user_credentials().
+    """
+    with _user_locks_lock:
+        if user_id not in _user_locks:
+            _user_locks[user_id] = threading.RLock()
+        return _user_locks[user_id]
+
+
+def _load_credentials(user_id: str | None) -> Credentials | None:
+    if user_id is None:
+        if settings.token_file.exists():
+            return Credentials.from_authorized_user_file(
+                settings.token_file, settings.scopes
             )
-            try:
-                creds = flow.run_local_server(
-                    port=settings.auth_port, open_browser=False
-                )
-            except Exception as e:
-                print(f"\nAuthentication error: {e}")
-                print("\nPlease ensure:")
-                print(f"1. Port {settings.auth_port} is accessible")
-                print("2. You've opened the URL in your browser")
-                print("3. The redirect URI is configured in Google Cloud Console")
-                raise
-        # Save the credentials for the next run
+        return None
+    token = get_credential_store().load(user_id)
+    if token is None:
+        return None
+    return Credentials.from_authorized_user_info(json.loads(token), settings.scopes)
+
+
+def _save_credentials(creds: Credentials, user_id: str | None):
+    if user_id is None:
         with open(settings.token_file, "w") as token:
             token.write(creds.to_json())
-    return creds
+    else:
+        get_credential_store().save(user_id, creds.to_json())
+
+
+def _run_auth_flow() -> Credentials:
+    flow = InstalledAppFlow.from_client_secrets_file(
+        settings.credentials_file, settings.scopes
+    )
+    try:
+        return flow.run_local_server(port=settings.auth_port, open_browser=False)
+    except Exception as e:
+        print(f"\nAuthentication error: {e}")
+        print("\nPlease ensure:")
+        print(f"1. Port {settings.auth_port} is accessible")
+        print("2. You've opened the URL in your browser")
+        print("3. The redirect URI is configured in Google Cloud Console")
+        raise
+
+
+def authenticate(user_id: str | None = None):
+    """
+    Handles user authentication for the Google Calendar API.
+    Without a user_id the single-user token.json is used, otherwise the token
+    is read from and written to the configured credential store.
+    """
+    with user_lock(user_id):
+        # The token stores the user's access and refresh tokens, and is
+        # created automatically when the authorization flow completes for the
+        # first time.
+        creds = _load_credentials(user_id)
+        # If there are no (valid) credentials available, let the user log in.
+        if not creds or not creds.valid:
+            if creds and creds.expired and creds.refresh_token:
+                creds.refresh(Request())
+            else:
+                creds = _run_auth_flow()
+            # Save the credentials for the next run
+            _save_credentials(creds, user_id)
+        return creds
 
 
-def refresh_token():
+def load_user_credentials(user_id: str) -> Credentials:
+    """
+    Loads the stored credentials for a user, refreshing them if expired.
+    Unlike authenticate() this never starts the interactive flow, so it is
+    safe to call while serving requests.
+    """
+    with user_lock(user_id):
+        creds = _load_credentials(user_id)
+        if creds is None:
+            raise LookupError(
+                f"No stored credentials for user '{user_id}'. "
+                f"Run `cal auth --user {user_id}` first."
+            )
+        if not creds.valid:
+            if not (creds.expired and creds.refresh_token):
+                raise LookupError(f"Stored credentials for user '{user_id}' are invalid.")
+            creds.refresh(Request())
+            _save_credentials(creds, user_id)
+        return creds
+
+
+def ensure_fresh(creds: Credentials, user_id: str | None = None):
+    """Refreshes shared credentials in place if they have expired."""
+    if creds.valid:
+        return
+    with user_lock(user_id):
+        # Another thread may have refreshed while we waited for the lock.
+        if not creds.valid and creds.refresh_token:
+            creds.refresh(Request())
+            _save_credentials(creds, user_id)
+
+
+def refresh_token(user_id: str | None = None):
     """Refreshes the authentication token."""
-    creds = None
-    if settings.token_file.exists():
-        creds = Credentials.from_authorized_user_file(
-            settings.token_file, settings.scopes
-        )
-    if creds and creds.refresh_token:
-        creds.refresh(Request())
-        with open(settings.token_file, "w") as token:
-            token.write(creds.to_json())
-        return True
-    return False
+    with user_lock(user_id):
+        creds = _load_credentials(user_id)
+        if creds and creds.refresh_token:
+            creds.refresh(Request())
+            _save_credentials(creds, user_id)
+            return True
+        return False
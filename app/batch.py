@@ -0,0 +1,124 @@
+import json
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from app.agent import agent
+from app.config import get_settings
+from app.google_calendar import get_service
+
+settings = get_settings()
+
+
+@dataclass
+class BatchStats:
+    succeeded: int = 0
+    failed: int = 0
+    elapsed: float = 0.0
+    latencies: list[float] = field(default_factory=list)
+
+    @property
+    def throughput(self) -> float:
+        """Queries completed per second."""
+        total = self.succeeded + self.failed
+        return total / self.elapsed if self.elapsed else 0.0
+
+    def percentile(self, p: float) -> float:
+        """Returns the p-th percentile latency in seconds (nearest rank)."""
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        rank = max(math.ceil(p / 100 * len(ordered)), 1)
+        return ordered[rank - 1]
+
+
+def _final_text(messages) -> str:
+    content = messages[-1].content
+    if isinstance(content, str):
+        return content
+    return "".join(
+        block["text"]
+        for block in content
+        if isinstance(block, dict) and block.get("type") == "text"
+    )
+
+
+def _run_query(record: dict) -> dict:
+    start = time.perf_counter()
+    result = {"id": record.get("id"), "query": record.get("query")}
+    if "error" in record:
+        # Never sent to the agent, so there is no latency to report.
+        return result | {"error": record["error"], "latency": None}
+    try:
+        state = agent.invoke(
+            {"messages": [{"role": "user", "content": record["query"]}]},
+            config={"max_concurrency": settings.tool_max_workers},
+        )
+        result["answer"] = _final_text(state["messages"])
+    except Exception as e:
+        result["error"] = str(e)
+    result["latency"] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def read_queries(path: Path) -> list[dict]:
+    """
+    Reads one query per line, either as {"id": ..., "query": ...} or as a
+    bare JSON string. Lines without an id are numbered from 1.
+    A line that isn't a valid query becomes a record with an "error", so it
+    is reported as a failed result instead of stopping the batch.
+    """
+    records = []
+    with open(path) as f:
+        for number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                records.append({"id": number, "error": f"Line {number}: invalid JSON: {e}"})
+                continue
+            if isinstance(record, str):
+                record = {"query": record}
+            if not isinstance(record, dict) or not isinstance(record.get("query"), str):
+                record_id = record.get("id", number) if isinstance(record, dict) else number
+                records.append(
+                    {"id": record_id, "error": f"Line {number}: expected a string 'query'."}
+                )
+                continue
+            record.setdefault("id", number)
+            records.append(record)
+    return records
+
+
+def run_batch(input_path: Path, output_path: Path, concurrency: int) -> BatchStats:
+    """
+    Runs every query in input_path through the agent, writing one JSON result
+    per line to output_path as soon as each query finishes.
+    All workers share the agent's model client and the pooled Calendar client.
+    """
+    records = read_queries(input_path)
+    # Authenticate up front: the interactive login flow can't run in a worker.
+    get_service()
+
+    stats = BatchStats()
+    start = time.perf_counter()
+    with (
+        open(output_path, "w") as out,
+        ThreadPoolExecutor(concurrency, thread_name_prefix="batch") as pool,
+    ):
+        futures = [pool.submit(_run_query, record) for record in records]
+        for future in as_completed(futures):
+            result = future.result()
+            out.write(json.dumps(result) + "\n")
+            out.flush()
+            if result["latency"] is not None:
+                stats.latencies.append(result["latency"])
+            if "error" in result:
+                stats.failed += 1
+            else:
+                stats.succeeded += 1
+    stats.elapsed = time.perf_counter() - start
+    return stats
@@ -0,0 +1,21 @@
+from app.config import get_settings
+from app.prefetch import get_event_cache
+from app.search_index import get_search_index
+
+
+def invalidate_caches(calendar_id: str = "primary"):
+    """Drops the local copies of a calendar after a write and refetches them."""
+    cache = get_event_cache()
+    if cache.active:
+        cache.invalidate(calendar_id)
+    if get_settings().search_index:
+        get_search_index().invalidate(calendar_id, refresh=True)
+
+
+def refresh_caches(calendar_id: str):
+    """Brings the local copies of a calendar up to date after a change."""
+    cache = get_event_cache()
+    if cache.active:
+        cache.refresh(calendar_id)
+    if get_settings().search_index:
+        get_search_index().refresh(calendar_id)
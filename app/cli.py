@@ -1,13 +1,25 @@
+import time
+from contextlib import contextmanager
 from datetime import datetime
+from pathlib import Path
 from typing import Annotated
 
+from googleapiclient.errors import HttpError  # type: ignore
+from langchain_core.messages import AIMessage, HumanMessage
 from rich.console import Console
 from rich.panel import Panel
 from rich.table import Table
-from typer import Argument, Option, Typer
+from typer import Argument, Exit, Option, Typer
 
 from app.agent import agent
+from app.analytics import fetch_event_arrays, summarize
 from app.auth import authenticate, refresh_token
+from app.batch import run_batch
+from app.client_pool import get_client_pool
+from app.caches import refresh_caches
+from app.config import get_settings
+from app.context_cache import prefix_tokens_saved
+from app.executor import get_tool_executor
 from app.google_calendar import (
     create_event as create_calendar_event,
 )
@@ -29,69 +41,289 @@ from app.google_calendar import (
 from app.google_calendar import (
     update_event as update_calendar_event,
 )
+from app.google_calendar import iter_events
+from app.output import (
+    CALENDAR_COLUMNS,
+    EVENT_COLUMNS,
+    OutputFormat,
+    calendar_row,
+    calendars_table,
+    event_row,
+    events_table,
+    write_rows,
+)
+from app.prefetch import get_event_cache
+from app.push import get_push_manager
+from app.router import FastPathRouter
+from app.search_index import get_search_index
+from app.sessions import get_session_store
+from app.write_queue import get_write_queue
 
 app = Typer()
 console = Console()
+# Errors of the streaming formats go to stderr, away from the data.
+err_console = Console(stderr=True)
+settings = get_settings()
 
 
 @app.command()
-def chat():
+def chat(
+    fast_path: Annotated[
+        bool,
+        Option(
+            "--fast-path/--no-fast-path",
+            help="Answer simple listing and lookup queries without the LLM.",
+        ),
+    ] = settings.fast_path,
+    session: Annotated[
+        str | None,
+        Option(
+            "--session",
+            "-s",
+            help="Save the conversation under this name and resume it next time.",
+        ),
+    ] = None,
+    prefetch: Annotated[
+        bool,
+        Option(
+            "--prefetch/--no-prefetch",
+            help="Load the coming days' events in the background at startup.",
+        ),
+    ] = settings.prefetch,
+    push: Annotated[
+        bool,
+        Option(
+            "--push/--no-push",
+            help="Keep prefetched events and the search index fresh with Calendar "
+            "push notifications (needs PUSH_ADDRESS).",
+        ),
+    ] = settings.push_notifications,
+):
     """Start a chat session with the agent."""
     console.print("Starting chat session. Type 'exit' to end.")
-    messages = []
+    if prefetch:
+        get_event_cache().start_prefetch()
+    if settings.search_index and get_search_index().get() is None:
+        get_search_index().refresh_in_background()
+    if push:
+        try:
+            manager = get_push_manager()
+            manager.on_change(refresh_caches)
+            manager.start(settings.push_calendars)
+        except Exception as e:
+            console.print(f"[bold red]Push notifications unavailable: {e}")
+            push = False
+    router = FastPathRouter() if fast_path else None
+    store = get_session_store() if session else None
+    messages = store.load(session) if store else []
+    if messages:
+        console.print(f"Resumed session '{session}' ({len(messages)} messages).")
+    cached_tokens_total = 0
     while True:
         query = input("You: ")
         if query.lower() == "exit":
             break
-        messages.append({"role": "user", "content": query})
-        inputs = {"messages": messages}
-        all_messages = []
-        
-        for chunk in agent.stream(inputs, stream_mode="updates"):
-            for step, data in chunk.items():
-                # Collect all messages from this step
-                all_messages = data["messages"]
-                ai_message = data["messages"][-1]
+        turn = []
+        if settings.write_behind and (failures := get_write_queue().pop_failures()):
+            for failure in failures:
+                console.print(f"[bold red]{failure}")
+            # Tell the agent too, it may have reported these changes as done.
+            # A message of its own keeps the user's text as typed.
+            failed = "\n".join(failures)
+            turn.append(HumanMessage(f"(These queued calendar changes failed:\n{failed})"))
+        turn.append(HumanMessage(query))
+
+        if router and (answer := router.try_answer(query)) is not None:
+            console.print(f"[bold green]Agent:[/bold green] {answer}")
+            # Keep the answer in the history so follow-up questions have context.
+            turn.append(AIMessage(answer))
+            messages.extend(turn)
+            if store:
+                store.append(session, turn)
+            print()
+            continue
+
+        inputs = {"messages": messages + turn}
+        cached_tokens = 0
+        turn_start = time.perf_counter()
+
+        # Tool calls from a single model message run concurrently, bounded by
+        # the tool executor's worker count.
+        config = {"max_concurrency": settings.tool_max_workers}
+        try:
+            for chunk in agent.stream(inputs, config=config, stream_mode="updates"):
+                for step, data in chunk.items():
+                    # Each update holds only the messages this step added
+                    turn.extend(data["messages"])
+                    ai_message = data["messages"][-1]
+                
+                    if step == "model":
+                        cached_tokens += prefix_tokens_saved(data["messages"])
+                        # Check if this is a tool call
+                        if hasattr(ai_message, 'tool_calls') and ai_message.tool_calls:
+                            for tool_call in ai_message.tool_calls:
+                                console.print(
+                                    Panel(
+                                        f"[cyan]Calling: [bold]{tool_call['name']}[/bold]\nArguments: {tool_call['args']}",
+                                        title="🔧 Tool Call",
+                                        border_style="cyan",
+                                        expand=False,
+                                    )
+                                )
+                        # Check if this is a text response
+                        elif ai_message.content:
+                            # Handle both string content and list of content blocks
+                            if isinstance(ai_message.content, str):
+                                console.print(f"[bold green]Agent:[/bold green] {ai_message.content}")
+                            elif isinstance(ai_message.content, list):
+                                for block in ai_message.content:
+                                    if isinstance(block, dict) and block.get('type') == 'text':
+                                        console.print(f"[bold green]Agent:[/bold green] {block['text']}")
                 
-                if step == "model":
-                    # Check if this is a tool call
-                    if hasattr(ai_message, 'tool_calls') and ai_message.tool_calls:
-                        for tool_call in ai_message.tool_calls:
+                    elif step == "tools":
+                        # Display tool output, one panel per parallel tool call
+                        for tool_message in data["messages"]:
                             console.print(
                                 Panel(
-                                    f"[cyan]Calling: [bold]{tool_call['name']}[/bold]\nArguments: {tool_call['args']}",
-                                    title="🔧 Tool Call",
-                                    border_style="cyan",
+                                    f"[magenta]{tool_message.content}",
+                                    title="📤 Tool Output",
+                                    border_style="magenta",
                                     expand=False,
                                 )
                             )
-                    # Check if this is a text response
-                    elif ai_message.content:
-                        # Handle both string content and list of content blocks
-                        if isinstance(ai_message.content, str):
-                            console.print(f"[bold green]Agent:[/bold green] {ai_message.content}")
-                        elif isinstance(ai_message.content, list):
-                            for block in ai_message.content:
-                                if isinstance(block, dict) and block.get('type') == 'text':
-                                    console.print(f"[bold green]Agent:[/bold green] {block['text']}")
-                
-                elif step == "tools":
-                    # Display tool output
-                    console.print(
-                        Panel(
-                            f"[magenta]{ai_message.content}",
-                            title="📤 Tool Output",
-                            border_style="magenta",
-                            expand=False,
-                        )
-                    )
+        except KeyboardInterrupt:
+            cancelled = get_tool_executor().cancel_pending()
+            console.print(
+                f"[yellow]Interrupted, cancelled {cancelled} pending tool call(s)."
+            )
+            continue
+
+        if router:
+            router.record_agent_turn(time.perf_counter() - turn_start)
+        if cached_tokens:
+            cached_tokens_total += cached_tokens
+            console.print(f"[dim]{cached_tokens} prompt tokens served from cache.")
 
         # Update messages with all messages from the agent's execution
         # This includes tool calls, tool responses, and final AI responses
-        if all_messages:
-            messages = all_messages
+        messages.extend(turn)
+        if store:
+            store.append(session, turn)
         print()
 
+    if settings.write_behind and (pending := get_write_queue().pending()):
+        console.print(f"Saving {pending} queued calendar change(s)...")
+        get_write_queue().stop()
+        for failure in get_write_queue().pop_failures():
+            console.print(f"[bold red]{failure}")
+    if prefetch:
+        stats = get_event_cache().stats()
+        console.print(
+            f"[dim]Prefetch cache: {stats['hits']} hits, {stats['misses']} misses "
+            f"({stats['hit_rate']:.0%})."
+        )
+    if push:
+        stats = get_push_manager().stats()
+        console.print(
+            f"[dim]Push: {stats['notifications']} notifications, "
+            f"{stats['refreshes']} calendar refreshes."
+        )
+    if cached_tokens_total:
+        console.print(
+            f"[dim]{cached_tokens_total} prompt tokens served from cache this session."
+        )
+    if router:
+        stats = router.stats()
+        console.print(
+            f"[dim]Fast path: {stats['hits']}/{stats['queries']} queries "
+            f"({stats['hit_rate']:.0%}), avg {stats['avg_fast_seconds']:.2f}s vs "
+            f"{stats['avg_agent_seconds']:.2f}s via the agent, "
+            f"~{stats['seconds_saved']:.1f}s saved."
+        )
+
+
+@app.command(name="agent-batch")
+def agent_batch(
+    input_file: Annotated[
+        Path, Argument(help="JSONL file with one query per line.", exists=True)
+    ],
+    output_file: Annotated[
+        Path, Argument(help="JSONL file to write the answers to.")
+    ],
+    concurrency: Annotated[
+        int, Option("--concurrency", "-n", help="Queries to run at the same time.")
+    ] = settings.batch_concurrency,
+):
+    """Run the queries in INPUT_FILE through the agent and write the answers."""
+    console.print(f"Running queries from {input_file} with concurrency {concurrency}...")
+    stats = run_batch(input_file, output_file, concurrency)
+
+    table = Table(title="Batch Results", show_header=False)
+    table.add_column("Metric", style="bold magenta")
+    table.add_column("Value")
+    table.add_row("Succeeded", str(stats.succeeded))
+    table.add_row("Failed", str(stats.failed))
+    table.add_row("Wall time", f"{stats.elapsed:.1f}s")
+    table.add_row("Throughput", f"{stats.throughput:.2f} queries/s")
+    for p in (50, 90, 99):
+        table.add_row(f"Latency p{p}", f"{stats.percentile(p):.2f}s")
+    pool = get_client_pool().stats()
+    table.add_row(
+        "Calendar clients",
+        f"{pool['size']}/{pool['max_size']} pooled, {pool['hits']} hits, "
+        f"{pool['misses']} misses, {pool['evictions']} evictions",
+    )
+    console.print(table)
+    console.print(f"Answers written to {output_file}.")
+
+
+@app.command()
+def sessions(
+    delete: Annotated[
+        str | None, Option(help="Delete the session with this name.")
+    ] = None,
+):
+    """List saved chat sessions."""
+    store = get_session_store()
+    if delete:
+        store.delete(delete)
+        console.print(f"Deleted session '{delete}'.")
+        return
+    saved = store.sessions()
+    if not saved:
+        console.print("No saved sessions.")
+        return
+
+    table = Table(title="Chat Sessions", show_header=True, header_style="bold magenta")
+    table.add_column("Name")
+    table.add_column("Messages")
+    table.add_column("Last Used", style="dim")
+    for name, count, updated in saved:
+        table.add_row(
+            name, str(count), datetime.fromtimestamp(updated).strftime("%Y-%m-%d %H:%M")
+        )
+    console.print(table)
+
+
+FORMAT_OPTION = Option(
+    "--format",
+    "-f",
+    help="Output format. json, jsonl and tsv stream rows to stdout as they are fetched.",
+)
+
+
+@contextmanager
+def exit_on_fetch_error():
+    """
+    Exits with status 1 if fetching rows fails, so that a failed fetch
+    can't pass for an empty result in a pipeline.
+    """
+    try:
+        yield
+    except HttpError as e:
+        err_console.print(f"[bold red]Could not fetch the data: {e}")
+        raise Exit(1)
+
 
 @app.command(name="list")
 def list_events_command(
@@ -106,74 +338,46 @@ def list_events_command(
             help="The ID of the calendar to list events from.",
         ),
     ] = "primary",
+    output_format: Annotated[OutputFormat, FORMAT_OPTION] = OutputFormat.table,
 ):
     """List the next MAX_RESULTS events from the calendar."""
+    if output_format is not OutputFormat.table:
+        events = iter_events(
+            calendar_id,
+            time_min=datetime.now().astimezone(),
+            max_results=max_results,
+            page_size=2500,
+            raise_errors=True,
+        )
+        with exit_on_fetch_error():
+            write_rows(map(event_row, events), output_format, EVENT_COLUMNS)
+        return
+
     console.print(f"Listing events from calendar '{calendar_id}'...")
     events = list_calendar_events(max_results, calendar_id)
     if not events:
         console.print("No upcoming events found.")
         return
-
-    table = Table(
-        title="Upcoming Events", show_header=True, header_style="bold magenta"
-    )
-    table.add_column("Start", style="dim")
-    table.add_column("End", style="dim")
-    table.add_column("Duration")
-    table.add_column("Summary")
-    table.add_column("ID", style="dim")
-
-    for event in events:
-        start_info = event["start"]
-        end_info = event["end"]
-        if "dateTime" in start_info:
-            start_dt = datetime.fromisoformat(start_info["dateTime"])
-            end_dt = datetime.fromisoformat(end_info["dateTime"])
-            duration = end_dt - start_dt
-            table.add_row(
-                start_dt.strftime("%A, %Y-%m-%d %H:%M"),
-                end_dt.strftime("%H:%M"),
-                str(duration),
-                event["summary"],
-                event["id"],
-            )
-        else:
-            table.add_row(
-                start_info["date"],
-                "",
-                "All day",
-                event["summary"],
-                event["id"],
-            )
-    console.print(table)
+    console.print(events_table(events, "Upcoming Events"))
 
 
 @app.command()
-def calendars():
+def calendars(
+    output_format: Annotated[OutputFormat, FORMAT_OPTION] = OutputFormat.table,
+):
     """List all calendars the user has access to."""
+    if output_format is not OutputFormat.table:
+        with exit_on_fetch_error():
+            calendars = get_calendar_list_events(raise_errors=True)
+            write_rows(map(calendar_row, calendars), output_format, CALENDAR_COLUMNS)
+        return
+
     console.print("Getting calendar list...")
     calendars = get_calendar_list_events()
     if not calendars:
         console.print("No calendars found.")
         return
-
-    table = Table(
-        title="Available Calendars",
-        show_header=True,
-        header_style="bold magenta",
-        expand=True,
-    )
-    table.add_column("Summary")
-    table.add_column("ID", style="dim", no_wrap=True)
-    table.add_column("Description", style="dim")
-
-    for calendar in calendars:
-        table.add_row(
-            calendar.get("summary"),
-            calendar.get("id"),
-            calendar.get("description", "N/A"),
-        )
-    console.print(table)
+    console.print(calendars_table(calendars))
 
 
 @app.command()
@@ -214,57 +418,64 @@ def search(
             help="The ID of the calendar to search in.",
         ),
     ] = "primary",
+    use_index: Annotated[
+        bool,
+        Option(
+            "--index/--no-index",
+            help="Rank results from the local search index while it is fresh.",
+        ),
+    ] = settings.search_index,
+    output_format: Annotated[OutputFormat, FORMAT_OPTION] = OutputFormat.table,
 ):
     """Search for events in the calendar."""
-    console.print(
-        f"Searching for events matching '{query}' in calendar '{calendar_id}'..."
-    )
-    events = search_calendar_events(
-        query,
-        max_results=max_results,
-        start_time=start_time,
-        end_time=end_time,
-        order_by=order,
-        calendar_id=calendar_id,
-    )
+    streaming = output_format is not OutputFormat.table
+    if not streaming:
+        console.print(
+            f"Searching for events matching '{query}' in calendar '{calendar_id}'..."
+        )
+    events = None
+    if use_index and order == "startTime":
+        # Times without a zone are local times.
+        events = get_search_index().search(
+            query,
+            max_results,
+            calendar_id,
+            start_time.astimezone() if start_time else None,
+            end_time.astimezone() if end_time else None,
+        )
+        if events is None and not streaming:
+            console.print(
+                "[dim]The search index is stale; run 'cal index' to refresh it.[/dim]"
+            )
+    if events is None and streaming:
+        events = iter_events(
+            calendar_id,
+            time_min=(start_time or datetime.now()).astimezone(),
+            time_max=end_time.astimezone() if end_time else None,
+            query=query,
+            max_results=max_results,
+            order_by=order,
+            page_size=2500,
+            raise_errors=True,
+        )
+    if streaming:
+        with exit_on_fetch_error():
+            write_rows(map(event_row, events), output_format, EVENT_COLUMNS)
+        return
+
+    if events is None:
+        events = search_calendar_events(
+            query,
+            max_results=max_results,
+            start_time=start_time,
+            end_time=end_time,
+            order_by=order,
+            calendar_id=calendar_id,
+        )
     if not events:
         console.print("No events found.")
         return
-
-    table = Table(
-        title=f"Search Results for '{query}'",
-        show_header=True,
-        header_style="bold magenta",
-    )
-    table.add_column("Start", style="dim")
-    table.add_column("End", style="dim")
-    table.add_column("Duration")
-    table.add_column("Summary")
-    table.add_column("ID", style="dim")
-
-    for event in events:
-        start_info = event["start"]
-        end_info = event["end"]
-        if "dateTime" in start_info:
-            start_dt = datetime.fromisoformat(start_info["dateTime"])
-            end_dt = datetime.fromisoformat(end_info["dateTime"])
-            duration = end_dt - start_dt
-            table.add_row(
-                start_dt.strftime("%A, %Y-%m-%d %H:%M"),
-                end_dt.strftime("%H:%M"),
-                str(duration),
-                event["summary"],
-                event["id"],
-            )
-        else:
-            table.add_row(
-                start_info["date"],
-                "",
-                "All day",
-                event["summary"],
-                event["id"],
-            )
-    console.print(table)
+    console.print(events_table(events, f"Search Results for '{query}'"))
 
 
 @app.command()
@@ -298,6 +509,8 @@ def create(
     create_calendar_event(
         summary, start_time, end_time, description, location, attendees
     )
+    if settings.search_index:
+        get_search_index().invalidate()
 
 
 @app.command()
@@ -307,6 +520,8 @@ def delete(
     """Delete an event from the calendar."""
     print(f"Deleting event {event_id}...")
     delete_calendar_event(event_id)
+    if settings.search_index:
+        get_search_index().invalidate()
 
 
 @app.command()
@@ -407,14 +622,149 @@ def update(
         location=location,
         attendees=attendees,
     )
+    if settings.search_index:
+        get_search_index().invalidate()
+
+
+@app.command()
+def index(
+    calendar_ids: Annotated[
+        list[str] | None,
+        Option(
+            "--calendar-id",
+            "-c",
+            help="A calendar to index; repeat for several. Defaults to primary.",
+        ),
+    ] = None,
+):
+    """Build or update the local search index used by 'cal search --index'."""
+    search_index = get_search_index()
+    for calendar_id in calendar_ids or ["primary"]:
+        start = time.perf_counter()
+        built = search_index.refresh(calendar_id)
+        console.print(
+            f"Indexed {len(built.events)} events from '{calendar_id}' "
+            f"in {time.perf_counter() - start:.2f}s."
+        )
+
+
+@app.command()
+def watch(
+    calendar_ids: Annotated[
+        list[str] | None,
+        Option(
+            "--calendar-id",
+            "-c",
+            help="A calendar to watch; repeat for several. Defaults to PUSH_CALENDARS.",
+        ),
+    ] = None,
+):
+    """Keep the search index up to date from Calendar push notifications."""
+    calendar_ids = calendar_ids or settings.push_calendars
+    # Other 'cal' processes read the index from disk, so keep it updated here
+    # whether or not this process would use it.
+    search_index = get_search_index()
+    for calendar_id in calendar_ids:
+        search_index.refresh(calendar_id)
+    manager = get_push_manager()
+    manager.on_change(search_index.refresh)
+    manager.start(calendar_ids)
+    console.print(
+        f"Watching {', '.join(calendar_ids)} on port {settings.push_port}. "
+        "Press Ctrl-C to stop."
+    )
+    try:
+        while True:
+            # Without changes the index would still turn stale for other
+            # processes; refreshing fetches only the changes, usually none.
+            time.sleep(settings.search_index_ttl / 2)
+            for calendar_id in calendar_ids:
+                search_index.refresh(calendar_id)
+    except KeyboardInterrupt:
+        stats = manager.stats()
+        console.print(
+            f"Stopped after {stats['notifications']} notifications and "
+            f"{stats['refreshes']} calendar refreshes."
+        )
+
+
+@app.command()
+def analytics(
+    days: Annotated[int, Option(help="How many past days to analyse.")] = 365,
+    calendar_ids: Annotated[
+        list[str] | None,
+        Option(
+            "--calendar-id",
+            "-c",
+            help="A calendar to include; repeat for several. Defaults to primary.",
+        ),
+    ] = None,
+    top: Annotated[int, Option(help="How many dates and attendees to show.")] = 5,
+):
+    """Summarise meeting time over the past DAYS days."""
+    calendar_ids = calendar_ids or ["primary"]
+    console.print(f"Analysing the last {days} days of {', '.join(calendar_ids)}...")
+    start = time.perf_counter()
+    try:
+        arrays = fetch_event_arrays(calendar_ids, days)
+    except Exception as e:
+        console.print(f"[bold red]Could not fetch events: {e}")
+        raise Exit(1)
+    fetched = time.perf_counter()
+    summary = summarize(arrays, top)
+    computed = time.perf_counter()
+    if not summary["events"]:
+        console.print("No events found.")
+        return
+
+    weekly = summary["weekly_hours"]
+    table = Table(title="Meeting Time", show_header=False)
+    table.add_column("Metric", style="bold magenta")
+    table.add_column("Value")
+    table.add_row("Meetings", str(summary["timed_events"]))
+    table.add_row("All-day events", str(summary["all_day_events"]))
+    table.add_row("Total hours", f"{summary['total_hours']:.1f}")
+    table.add_row("Average length", f"{summary['average_hours'] * 60:.0f} min")
+    table.add_row("Median length", f"{summary['median_hours'] * 60:.0f} min")
+    table.add_row("Hours per week", f"{weekly['average']:.1f} (max {weekly['max']:.1f})")
+    console.print(table)
+
+    for title, key, column, unit in [
+        ("Hours by Weekday", "weekday_hours", "Weekday", "{:.1f}"),
+        ("Busiest Dates", "busiest_dates", "Date", "{:.1f}"),
+        ("Hours by Calendar", "calendar_hours", "Calendar", "{:.1f}"),
+        ("Most Frequent Attendees", "top_attendees", "Attendee", "{}"),
+        ("Attendees Most Often Together", "attendee_overlap", "Attendees", "{}"),
+    ]:
+        if not summary[key]:
+            continue
+        table = Table(title=title, show_header=True, header_style="bold magenta")
+        table.add_column(column)
+        table.add_column("Meetings" if unit == "{}" else "Hours", justify="right")
+        for name, value in summary[key].items():
+            table.add_row(name, unit.format(value))
+        console.print(table)
+    console.print(
+        f"[dim]{len(arrays)} events fetched in {fetched - start:.2f}s, "
+        f"summarised in {(computed - fetched) * 1000:.1f}ms[/dim]"
+    )
 
 
 @app.command()
-def auth():
+def auth(
+    user: Annotated[
+        str | None,
+        Option(
+            "--user",
+            "-u",
+            help="Store the token for this user in the multi-user credential store.",
+        ),
+    ] = None,
+):
     """Refresh the authentication token."""
-    if refresh_token():
+    if refresh_token(user):
         print("Authentication token refreshed.")
     else:
         print("No authentication token found. Starting authentication flow...")
-        authenticate()
+        authenticate(user)
         print("Authentication complete!")
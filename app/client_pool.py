@@ -0,0 +1,105 @@
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+import httplib2  # type: ignore
+from google.auth.exceptions import RefreshError
+from google_auth_httplib2 import AuthorizedHttp  # type: ignore
+from googleapiclient.discovery import build, build_from_document  # type: ignore
+from googleapiclient.http import HttpRequest  # type: ignore
+
+from app.auth import authenticate, ensure_fresh, load_user_credentials, user_lock
+from app.config import get_settings
+from app.discovery import load_discovery_document
+from app.logger import logger
+
+
+def _build_service(creds):
+    # httplib2.Http is not thread-safe, so every request gets its own
+    # transport while the parsed service object and credentials are shared.
+    def request_builder(http, *args, **kwargs):
+        return HttpRequest(AuthorizedHttp(creds, http=httplib2.Http()), *args, **kwargs)
+
+    document = load_discovery_document("calendar", "v3")
+    if document is None:
+        return build(
+            "calendar", "v3", credentials=creds, requestBuilder=request_builder
+        )
+    return build_from_document(
+        document, credentials=creds, requestBuilder=request_builder
+    )
+
+
+class ClientPool:
+    """A bounded LRU pool of authenticated Calendar service clients, keyed by user."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._clients: OrderedDict[str | None, tuple] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, user_id: str | None = None):
+        """Returns the Calendar service for user_id, building it on first use."""
+        with self._lock:
+            entry = self._clients.get(user_id)
+            if entry is not None:
+                self._clients.move_to_end(user_id)
+                self.hits += 1
+        if entry is not None:
+            creds, service = entry
+            try:
+                ensure_fresh(creds, user_id)
+            except RefreshError:
+                # The token was revoked or expired for good; a later call
+                # must load the user's credentials again, not reuse these.
+                self.discard(user_id)
+                raise
+            return service
+
+        # Build outside the pool lock so one slow user doesn't block the
+        # others; the user lock stops two threads building the same client.
+        with user_lock(user_id):
+            with self._lock:
+                entry = self._clients.get(user_id)
+            if entry is None:
+                creds = (
+                    authenticate() if user_id is None else load_user_credentials(user_id)
+                )
+                entry = (creds, _build_service(creds))
+        with self._lock:
+            if user_id not in self._clients:
+                self.misses += 1
+                self._clients[user_id] = entry
+            self._clients.move_to_end(user_id)
+            while len(self._clients) > self.max_size:
+                evicted, _ = self._clients.popitem(last=False)
+                self.evictions += 1
+                logger.info(
+                    f"Evicted Calendar client for user {evicted!r}; raise "
+                    f"CLIENT_POOL_SIZE ({self.max_size}) if this happens often",
+                    extra={"evictions": self.evictions},
+                )
+        return entry[1]
+
+    def discard(self, user_id: str | None = None):
+        """Drops the cached client for user_id, e.g. after its token was revoked."""
+        with self._lock:
+            self._clients.pop(user_id, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._clients),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+@lru_cache
+def get_client_pool() -> ClientPool:
+    return ClientPool(get_settings().client_pool_size)
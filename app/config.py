@@ -9,8 +9,45 @@ class Settings(BaseSettings):
     app_name: str = "Calendar Agent"
     credentials_file: Path = Path("credentials.json")
     token_file: Path = Path("token.json")
+    token_store: str = "file"  # "file" or "sqlite"
+    token_dir: Path = Path("tokens")
+    token_db: Path = Path("tokens.db")
+    client_pool_size: int = 32
+    tool_max_workers: int = 8
+    tool_timeout: float = 30.0
+    tool_concurrency: dict[str, int] = {}
+    fast_path: bool = False
+    context_cache: bool = False
+    context_cache_ttl: int = 3600
+    tool_selection: bool = False
+    session_db: Path = Path("sessions.db")
+    session_history_limit: int = 200
+    session_tool_result_chars: int = 2000
+    batch_concurrency: int = 4
+    write_behind: bool = False
+    write_queue_db: Path = Path("write_queue.db")
+    write_queue_batch_size: int = 50
+    write_queue_interval: float = 2.0
+    prefetch: bool = False
+    prefetch_days: int = 7
+    prefetch_ttl: float = 300.0
+    discovery_cache_dir: Path = Path(".cache/discovery")
+    search_index: bool = False
+    search_index_file: Path = Path(".cache/search_index.json")
+    search_index_past_days: int = 30
+    search_index_days: int = 180
+    search_index_ttl: float = 900.0
+    push_notifications: bool = False
+    push_address: Optional[str] = None  # public HTTPS URL that reaches the receiver
+    push_host: str = "127.0.0.1"
+    push_port: int = 8765
+    push_calendars: list[str] = ["primary"]
+    push_channel_ttl: int = 86400
+    push_renew_margin: float = 3600.0
     scopes: list[str] = ["https://www.googleapis.com/auth/calendar"]
     log_level: str = "INFO"
+    log_format: str = "text"  # "text" or "json"
+    log_sample_rate: float = 1.0  # share of records below WARNING that are kept
     auth_port: int = 8888
     google_api_key: Optional[str] = None
     model_provider: str = "google_genai"
@@ -0,0 +1,128 @@
+import datetime
+import threading
+from functools import lru_cache
+from typing import Any
+
+from google.ai.generativelanguage_v1beta import (  # type: ignore
+    CacheServiceClient,
+    CachedContent,
+    Content,
+    Part,
+)
+from google.protobuf import duration_pb2
+from langchain.agents.middleware import AgentMiddleware, ModelRequest
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from langchain_google_genai._function_utils import (  # type: ignore
+    convert_to_genai_function_declarations,
+)
+
+from app.config import get_settings
+from app.logger import logger
+from app.prompt import prompt
+
+# Recreate the cache this long before it expires so a request never races
+# the expiry.
+EXPIRY_MARGIN = datetime.timedelta(minutes=1)
+
+
+@lru_cache
+def get_tool_schemas(tools: tuple) -> list[dict[str, Any]]:
+    """
+    Converts the agent's tools to JSON schemas once.
+    Binding the tool functions directly makes LangChain rebuild their pydantic
+    schemas on every model call.
+    """
+    return [convert_to_openai_tool(tool) for tool in tools]
+
+
+class ContextCache:
+    """
+    A Gemini cached content holding the system prompt and tool declarations.
+    Requests that reference it don't resend the static prefix, which the
+    API then bills at the reduced cached-token rate.
+    """
+
+    def __init__(self, tool_schemas: list[dict[str, Any]], ttl: int):
+        settings = get_settings()
+        self.model = settings.model_name
+        if not self.model.startswith("models/"):
+            self.model = f"models/{self.model}"
+        self.tool_schemas = tool_schemas
+        self.ttl = ttl
+        self.token_count = 0
+        self._client = CacheServiceClient(
+            client_options={"api_key": settings.google_api_key}
+        )
+        self._name: str | None = None
+        self._expires_at = datetime.datetime.min.replace(tzinfo=datetime.UTC)
+        self._lock = threading.Lock()
+
+    def _create(self):
+        cached = self._client.create_cached_content(
+            cached_content=CachedContent(
+                model=self.model,
+                display_name="calendar-agent-prefix",
+                system_instruction=Content(parts=[Part(text=prompt)]),
+                tools=[convert_to_genai_function_declarations(self.tool_schemas)],
+                ttl=duration_pb2.Duration(seconds=self.ttl),
+            )
+        )
+        self._name = cached.name
+        self._expires_at = cached.expire_time
+        self.token_count = cached.usage_metadata.total_token_count
+        logger.info(f"Created context cache {cached.name} ({self.token_count} tokens)")
+
+    def name(self) -> str | None:
+        """Returns the cache name, creating or recreating it when needed."""
+        with self._lock:
+            now = datetime.datetime.now(tz=datetime.UTC)
+            if self._name is None or now >= self._expires_at - EXPIRY_MARGIN:
+                try:
+                    self._create()
+                except Exception as e:
+                    # Prompts below the model's minimum cache size are rejected;
+                    # the agent then sends the prefix uncached.
+                    logger.warning(f"Context caching unavailable: {e}")
+                    self._name = None
+                    self._expires_at = now + datetime.timedelta(seconds=self.ttl)
+            return self._name
+
+
+class PrefixCacheMiddleware(AgentMiddleware):
+    """
+    Sends the precomputed tool schemas instead of the tool functions and, if a
+    context cache is configured, references it instead of sending the system
+    prompt and tool declarations at all.
+    """
+
+    def __init__(self, tools: list, context_cache: ContextCache | None = None):
+        super().__init__()
+        self.schemas_by_name = {
+            schema["function"]["name"]: schema
+            for schema in get_tool_schemas(tuple(tools))
+        }
+        self.context_cache = context_cache
+
+    def modify_model_request(
+        self, request: ModelRequest, state, runtime
+    ) -> ModelRequest:
+        cache_name = self.context_cache.name() if self.context_cache else None
+        if cache_name:
+            request.system_prompt = None
+            request.tools = []
+            request.model_settings["cached_content"] = cache_name
+        else:
+            request.tools = [
+                self.schemas_by_name.get(getattr(tool, "name", None), tool)
+                for tool in request.tools
+            ]
+        return request
+
+
+def prefix_tokens_saved(messages) -> int:
+    """Sums the prompt tokens served from the cache for the given AI messages."""
+    saved = 0
+    for message in messages:
+        usage = getattr(message, "usage_metadata", None) or {}
+        saved += usage.get("input_token_details", {}).get("cache_read", 0)
+    return saved
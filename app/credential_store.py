@@ -0,0 +1,99 @@
+import os
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+from pathlib import Path
+
+from app.config import get_settings
+
+
+def _check_user_id(user_id: str) -> str:
+    if not user_id or user_id in (".", "..") or "/" in user_id or "\\" in user_id:
+        raise ValueError(f"Invalid user ID: {user_id!r}")
+    return user_id
+
+
+class FileCredentialStore:
+    """Stores one authorized-user JSON token file per user in a directory."""
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+
+    def _path(self, user_id: str) -> Path:
+        return self.directory / f"{_check_user_id(user_id)}.json"
+
+    def load(self, user_id: str) -> str | None:
+        path = self._path(user_id)
+        if not path.exists():
+            return None
+        return path.read_text()
+
+    def save(self, user_id: str, token: str):
+        path = self._path(user_id)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file first so a concurrent reader never sees a
+        # partially written token.
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp_path.write_text(token)
+        os.replace(tmp_path, path)
+
+    def delete(self, user_id: str):
+        self._path(user_id).unlink(missing_ok=True)
+
+    def users(self) -> list[str]:
+        if not self.directory.exists():
+            return []
+        return sorted(path.stem for path in self.directory.glob("*.json"))
+
+
+class SQLiteCredentialStore:
+    """Stores authorized-user JSON tokens in a single SQLite database."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS tokens ("
+                "user_id TEXT PRIMARY KEY, token TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+
+    def load(self, user_id: str) -> str | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT token FROM tokens WHERE user_id = ?", (_check_user_id(user_id),)
+            ).fetchone()
+        return row[0] if row else None
+
+    def save(self, user_id: str, token: str):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO tokens (user_id, token, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(user_id) DO UPDATE SET "
+                "token = excluded.token, updated_at = excluded.updated_at",
+                (_check_user_id(user_id), token, time.time()),
+            )
+
+    def delete(self, user_id: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM tokens WHERE user_id = ?", (user_id,))
+
+    def users(self) -> list[str]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT user_id FROM tokens ORDER BY user_id"
+            ).fetchall()
+        return [row[0] for row in rows]
+
+
+@lru_cache
+def get_credential_store() -> FileCredentialStore | SQLiteCredentialStore:
+    """Returns the credential store selected by the `token_store` setting."""
+    settings = get_settings()
+    if settings.token_store == "sqlite":
+        return SQLiteCredentialStore(settings.token_db)
+    if settings.token_store == "file":
+        return FileCredentialStore(settings.token_dir)
+    raise ValueError(f"Unknown token store: {settings.token_store!r}")
@@ -0,0 +1,57 @@
+import json
+import marshal
+import os
+import sys
+from functools import lru_cache
+
+from googleapiclient import discovery_cache  # type: ignore
+from googleapiclient.version import __version__ as client_version  # type: ignore
+
+from app.config import get_settings
+
+
+def _cache_path(api: str, version: str):
+    # marshal's format is tied to the Python version and the document to the
+    # client library version, so both are part of the file name.
+    python = f"py{sys.version_info.major}{sys.version_info.minor}"
+    name = f"{api}-{version}-{client_version}-{python}.marshal"
+    return get_settings().discovery_cache_dir / name
+
+
+@lru_cache
+def load_discovery_document(api: str = "calendar", version: str = "v3") -> dict | None:
+    """
+    Returns the parsed discovery document for an API, or None if the client
+    library doesn't bundle it.
+    The parsed document is kept on disk so later processes skip the JSON
+    parsing; files written by other library or Python versions are replaced.
+    """
+    path = _cache_path(api, version)
+    try:
+        return marshal.loads(path.read_bytes())
+    except (OSError, EOFError, ValueError, TypeError):
+        pass
+
+    content = discovery_cache.get_static_doc(api, version)
+    if content is None:
+        return None
+    document = json.loads(content)
+
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        for stale in path.parent.glob(f"{api}-{version}-*.marshal"):
+            stale.unlink(missing_ok=True)
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp_path.write_bytes(marshal.dumps(document))
+        os.replace(tmp_path, path)
+    except OSError:
+        # A read-only cache directory only costs us the speed-up.
+        pass
+    return document
+
+
+def clear_discovery_cache():
+    """Removes every cached discovery document."""
+    load_discovery_document.cache_clear()
+    for path in get_settings().discovery_cache_dir.glob("*.marshal"):
+        path.unlink(missing_ok=True)
@@ -0,0 +1,156 @@
+import functools
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Callable
+
+from app.config import get_settings
+
+# Tools that modify an event. Calls to these are serialized per event ID so two
+# concurrent edits of the same event can't overwrite each other.
+WRITE_TOOLS = {"update_calendar_event", "delete_calendar_event"}
+# Tools that change the calendar. A timed-out call to one of these may still
+# take effect, so retrying it could e.g. create the same event twice.
+MUTATING_TOOLS = WRITE_TOOLS | {"create_calendar_event"}
+
+
+class SlotTimeoutError(Exception):
+    """A tool call timed out waiting for its concurrency limit, before it ran."""
+
+
+class ToolExecutor:
+    """
+    Runs tool calls on a bounded thread pool.
+    Reads run in parallel, writes to the same event are serialized, each tool
+    can have its own concurrency limit and every call is bounded by a timeout.
+    """
+
+    def __init__(
+        self,
+        max_workers: int,
+        timeout: float,
+        limits: dict[str, int] | None = None,
+    ):
+        self.timeout = timeout
+        self._pool = ThreadPoolExecutor(max_workers, thread_name_prefix="tool")
+        self._limits = {
+            name: threading.BoundedSemaphore(limit)
+            for name, limit in (limits or {}).items()
+        }
+        self._event_locks: dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._pending: set[Future] = set()
+        # When each submitted call times out, counted from its submission.
+        self._deadlines: dict[Future, float] = {}
+
+    def _event_lock(self, event_id: str) -> threading.Lock:
+        with self._lock:
+            if event_id not in self._event_locks:
+                self._event_locks[event_id] = threading.Lock()
+            return self._event_locks[event_id]
+
+    def _run(self, func: Callable, args: tuple, kwargs: dict):
+        event_id = kwargs.get("event_id") or (args[0] if args else None)
+        if func.__name__ in WRITE_TOOLS and event_id:
+            with self._event_lock(event_id):
+                return func(*args, **kwargs)
+        return func(*args, **kwargs)
+
+    def submit(self, func: Callable, *args, **kwargs) -> Future:
+        """
+        Schedules a tool call and returns its future.
+        A tool with a concurrency limit waits for a free slot here, in the
+        caller, so that calls queued behind the limit don't hold pool workers.
+        """
+        deadline = time.monotonic() + self.timeout
+        limit = self._limits.get(func.__name__)
+        if limit:
+            if not limit.acquire(timeout=self.timeout):
+                future: Future = Future()
+                future.set_exception(SlotTimeoutError())
+                return future
+        future = self._pool.submit(self._run, func, args, kwargs)
+        if limit:
+            # Also releases the slot if the call is cancelled before it runs.
+            future.add_done_callback(lambda _: limit.release())
+        with self._lock:
+            self._pending.add(future)
+            self._deadlines[future] = deadline
+        future.add_done_callback(self._forget)
+        return future
+
+    def _forget(self, future: Future):
+        with self._lock:
+            self._pending.discard(future)
+            self._deadlines.pop(future, None)
+
+    def result(self, future: Future, name: str) -> str:
+        """
+        Waits for a tool call, returning an error message on timeout.
+        The timeout runs from submission, so it includes time spent waiting for
+        a concurrency slot and queued behind other calls. A call that is
+        already running when it times out keeps its worker until it returns, and
+        a calendar change made by it may still go through.
+        """
+        with self._lock:
+            deadline = self._deadlines.get(future)
+        remaining = self.timeout if deadline is None else deadline - time.monotonic()
+        try:
+            return future.result(timeout=max(remaining, 0.0))
+        except SlotTimeoutError:
+            return (
+                f"Error: {name} timed out after {self.timeout:g} seconds waiting "
+                "for other calls to finish. It did not run, so it is safe to retry."
+            )
+        except FutureTimeoutError:
+            if future.cancel() or name not in MUTATING_TOOLS:
+                return f"Error: {name} timed out after {self.timeout:g} seconds."
+            return (
+                f"Error: {name} did not finish within {self.timeout:g} seconds and "
+                "may still complete. Do not retry it; check the calendar with "
+                "list_calendar_events or search_calendar_events first."
+            )
+
+    def call(self, func: Callable, *args, **kwargs) -> str:
+        """Runs a single tool call through the pool and waits for it."""
+        return self.result(self.submit(func, *args, **kwargs), func.__name__)
+
+    def run_all(self, calls: list[tuple[Callable, dict]]) -> list[str]:
+        """Runs several tool calls concurrently, returning results in order."""
+        futures = [(func, self.submit(func, **kwargs)) for func, kwargs in calls]
+        return [self.result(future, func.__name__) for func, future in futures]
+
+    def wrap(self, func: Callable) -> Callable:
+        """
+        Returns a function with the same name, signature and docstring as func
+        whose calls go through this executor, so it can be handed to the agent.
+        """
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return self.call(func, *args, **kwargs)
+
+        return wrapper
+
+    def wrap_tools(self, tools: list[Callable]) -> list[Callable]:
+        return [self.wrap(tool) for tool in tools]
+
+    def cancel_pending(self) -> int:
+        """Cancels tool calls that have not started yet, returning how many."""
+        with self._lock:
+            pending = list(self._pending)
+        return sum(future.cancel() for future in pending)
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+@functools.lru_cache
+def get_tool_executor() -> ToolExecutor:
+    settings = get_settings()
+    return ToolExecutor(
+        settings.tool_max_workers,
+        settings.tool_timeout,
+        settings.tool_concurrency,
+    )
@@ -1,39 +1,119 @@
 import datetime
-from typing import Sequence
+from typing import Iterator, Sequence
 
-from googleapiclient.discovery import build  # type: ignore
 from googleapiclient.errors import HttpError  # type: ignore
 
-from app.auth import authenticate
+from app.client_pool import get_client_pool
+from app.logger import log_operation, logger
 
 
-def list_events(max_results: int = 10, calendar_id: str = "primary") -> Sequence:
+def get_service(user_id: str | None = None):
+    """Returns the pooled Calendar service for a user (default: token.json user)."""
+    return get_client_pool().get(user_id)
+
+
+def list_events(
+    max_results: int = 10,
+    calendar_id: str = "primary",
+    user_id: str | None = None,
+    time_min: datetime.datetime | None = None,
+    time_max: datetime.datetime | None = None,
+) -> Sequence:
     """
     Lists the next max_results events on the user's calendar.
+    Events start at time_min (default: now) and, if given, end before time_max.
     """
-    creds = authenticate()
-    try:
-        service = build("calendar", "v3", credentials=creds)
-
-        # Call the Calendar API
-        now = datetime.datetime.now(tz=datetime.timezone.utc).isoformat()
-        print(f"Getting the upcoming {max_results} events")
-        events_result = (
-            service.events()
-            .list(
-                calendarId=calendar_id,
-                timeMin=now,
-                maxResults=max_results,
-                singleEvents=True,
-                orderBy="startTime",
+    with log_operation("list_events", calendar_id=calendar_id, api_calls=0) as op:
+        try:
+            service = get_service(user_id)
+
+            # Call the Calendar API
+            now = datetime.datetime.now(tz=datetime.timezone.utc)
+            time_min = time_min or now
+            op["api_calls"] += 1
+            events_result = (
+                service.events()
+                .list(
+                    calendarId=calendar_id,
+                    timeMin=time_min.isoformat(),
+                    timeMax=time_max.isoformat() if time_max else None,
+                    maxResults=max_results,
+                    singleEvents=True,
+                    orderBy="startTime",
+                )
+                .execute()
             )
-            .execute()
-        )
-        return events_result.get("items", [])
+            items = events_result.get("items", [])
+            op["events"] = len(items)
+            return items
 
-    except HttpError as error:
-        print(f"An error occurred: {error}")
-        return []
+        except HttpError as error:
+            op["error"] = str(error)
+            return []
+
+
+def iter_events(
+    calendar_id: str = "primary",
+    time_min: datetime.datetime | None = None,
+    time_max: datetime.datetime | None = None,
+    query: str | None = None,
+    max_results: int | None = None,
+    order_by: str | None = "startTime",
+    page_size: int = 250,
+    user_id: str | None = None,
+    raise_errors: bool = False,
+    updated_min: datetime.datetime | None = None,
+    show_deleted: bool = False,
+    single_events: bool = True,
+) -> Iterator[dict]:
+    """
+    Yields events page by page, so callers can process them as they arrive.
+    Stops after max_results events if given, otherwise after the last page.
+    With raise_errors, API errors are raised instead of ending the iteration,
+    for callers that must not mistake a failed fetch for an empty calendar.
+    updated_min and show_deleted list only the events changed (or deleted)
+    since then.
+    The logged duration runs until the caller stops iterating.
+    """
+    with log_operation(
+        "iter_events", calendar_id=calendar_id, api_calls=0, events=0
+    ) as op:
+        try:
+            service = get_service(user_id)
+            page_token = None
+            remaining = max_results
+            while remaining is None or remaining > 0:
+                op["api_calls"] += 1
+                events_result = (
+                    service.events()
+                    .list(
+                        calendarId=calendar_id,
+                        q=query,
+                        timeMin=time_min.isoformat() if time_min else None,
+                        timeMax=time_max.isoformat() if time_max else None,
+                        maxResults=min(page_size, remaining or page_size),
+                        singleEvents=single_events,
+                        orderBy=order_by,
+                        pageToken=page_token,
+                        updatedMin=updated_min.isoformat() if updated_min else None,
+                        showDeleted=show_deleted or None,
+                    )
+                    .execute()
+                )
+                items = events_result.get("items", [])
+                if remaining is not None:
+                    items = items[:remaining]
+                    remaining -= len(items)
+                op["events"] += len(items)
+                yield from items
+                page_token = events_result.get("nextPageToken")
+                if not page_token:
+                    return
+
+        except HttpError as error:
+            if raise_errors:
+                raise
+            op["error"] = str(error)
 
 
 def create_event(
@@ -43,87 +123,108 @@ def create_event(
     description: str | None = None,
     location: str | None = None,
     attendees: list[str] | None = None,
+    user_id: str | None = None,
 ):
     """Creates an event on the user's calendar."""
-    creds = authenticate()
-    try:
-        service = build("calendar", "v3", credentials=creds)
-        event = {
-            "summary": summary,
-            "location": location,
-            "description": description,
-            "start": {
-                "dateTime": start_time.isoformat(),
-                "timeZone": "UTC",
-            },
-            "end": {
-                "dateTime": end_time.isoformat(),
-                "timeZone": "UTC",
-            },
-            "attendees": [{"email": email} for email in attendees] if attendees else [],
-        }
-        event = service.events().insert(calendarId="primary", body=event).execute()
-        print(f"Event created: {event.get('htmlLink')}")
-
-    except HttpError as error:
-        print(f"An error occurred: {error}")
-
-
-def get_event(event_id: str, calendar_id: str = "primary"):
+    with log_operation("create_event", calendar_id="primary", api_calls=0) as op:
+        try:
+            service = get_service(user_id)
+            event = {
+                "summary": summary,
+                "location": location,
+                "description": description,
+                "start": {
+                    "dateTime": start_time.isoformat(),
+                    "timeZone": "UTC",
+                },
+                "end": {
+                    "dateTime": end_time.isoformat(),
+                    "timeZone": "UTC",
+                },
+                "attendees": [{"email": email} for email in attendees] if attendees else [],
+            }
+            op["api_calls"] += 1
+            event = service.events().insert(calendarId="primary", body=event).execute()
+            op["event_id"] = event.get("id")
+            logger.info(f"Event created: {event.get('htmlLink')}")
+
+        except HttpError as error:
+            op["error"] = str(error)
+
+
+def get_event(
+    event_id: str, calendar_id: str = "primary", user_id: str | None = None
+):
     """Gets a specific event from the user's calendar."""
-    creds = authenticate()
-    try:
-        service = build("calendar", "v3", credentials=creds)
-        event = (
-            service.events().get(calendarId=calendar_id, eventId=event_id).execute()
-        )
-        return event
+    with log_operation(
+        "get_event", calendar_id=calendar_id, event_id=event_id, api_calls=0
+    ) as op:
+        try:
+            service = get_service(user_id)
+            op["api_calls"] += 1
+            event = (
+                service.events().get(calendarId=calendar_id, eventId=event_id).execute()
+            )
+            return event
+
+        except HttpError as error:
+            op["error"] = str(error)
+            return None
+
 
-    except HttpError as error:
-        print(f"An error occurred: {error}")
-        return None
+def event_fields(**kwargs) -> dict:
+    """Converts keyword arguments such as start_time or attendees to API event fields."""
+    fields = {}
+    for key, value in kwargs.items():
+        if value is not None:
+            if key in ["start_time", "end_time"]:
+                fields[key.replace("_time", "")] = {
+                    "dateTime": value.isoformat(),
+                    "timeZone": "UTC",
+                }
+            elif key == "attendees":
+                fields["attendees"] = [{"email": email} for email in value]
+            else:
+                fields[key] = value
+    return fields
 
 
-def update_event(event_id: str, **kwargs):
+def update_event(event_id: str, user_id: str | None = None, **kwargs):
     """Updates an event on the user's calendar."""
-    creds = authenticate()
-    try:
-        service = build("calendar", "v3", credentials=creds)
-        event = service.events().get(calendarId="primary", eventId=event_id).execute()
-
-        for key, value in kwargs.items():
-            if value is not None:
-                if key in ["start_time", "end_time"]:
-                    event[key.replace("_time", "")] = {
-                        "dateTime": value.isoformat(),
-                        "timeZone": "UTC",
-                    }
-                elif key == "attendees":
-                    event["attendees"] = [{"email": email} for email in value]
-                else:
-                    event[key] = value
-
-        updated_event = (
-            service.events()
-            .update(calendarId="primary", eventId=event_id, body=event)
-            .execute()
-        )
-        print(f"Event updated: {updated_event.get('htmlLink')}")
-
-    except HttpError as error:
-        print(f"An error occurred: {error}")
-
-
-def delete_event(event_id: str):
+    with log_operation(
+        "update_event", calendar_id="primary", event_id=event_id, api_calls=0
+    ) as op:
+        try:
+            service = get_service(user_id)
+            op["api_calls"] += 1
+            event = service.events().get(calendarId="primary", eventId=event_id).execute()
+            event.update(event_fields(**kwargs))
+
+            op["api_calls"] += 1
+            updated_event = (
+                service.events()
+                .update(calendarId="primary", eventId=event_id, body=event)
+                .execute()
+            )
+            logger.info(f"Event updated: {updated_event.get('htmlLink')}")
+
+        except HttpError as error:
+            op["error"] = str(error)
+
+
+def delete_event(event_id: str, user_id: str | None = None):
     """Deletes an event from the user's calendar."""
-    creds = authenticate()
-    try:
-        service = build("calendar", "v3", credentials=creds)
-        service.events().delete(calendarId="primary", eventId=event_id).execute()
-        print("Event deleted.")
+    with log_operation(
+        "delete_event", calendar_id="primary", event_id=event_id, api_calls=0
+    ) as op:
+        try:
+            service = get_service(user_id)
+            op["api_calls"] += 1
+            service.events().delete(calendarId="primary", eventId=event_id).execute()
+            logger.info("Event deleted.")
 
-    except HttpError as error:
-        print(f"An error occurred: {error}")
+        except HttpError as error:
+            op["error"] = str(error)
 
 
 def search_events(
@@ -133,45 +234,54 @@ def search_events(
     end_time: datetime.datetime | None = None,
     order_by: str = "startTime",
     calendar_id: str = "primary",
+    user_id: str | None = None,
 ) -> Sequence:
     """Searches for events on the user's calendar."""
-    creds = authenticate()
-    try:
-        service = build("calendar", "v3", credentials=creds)
-        now = datetime.datetime.now(tz=datetime.timezone.utc)
-        start_time = start_time or now
-
-        events_result = (
-            service.events()
-            .list(
-                calendarId=calendar_id,
-                q=query,
-                timeMin=start_time.isoformat(),
-                timeMax=end_time.isoformat() if end_time else None,
-                maxResults=max_results,
-                singleEvents=True,
-                orderBy=order_by,
+    with log_operation("search_events", calendar_id=calendar_id, api_calls=0) as op:
+        try:
+            service = get_service(user_id)
+            now = datetime.datetime.now(tz=datetime.timezone.utc)
+            start_time = start_time or now
+
+            op["api_calls"] += 1
+            events_result = (
+                service.events()
+                .list(
+                    calendarId=calendar_id,
+                    q=query,
+                    timeMin=start_time.isoformat(),
+                    timeMax=end_time.isoformat() if end_time else None,
+                    maxResults=max_results,
+                    singleEvents=True,
+                    orderBy=order_by,
+                )
+                .execute()
             )
-            .execute()
-        )
-        return events_result.get("items", [])
-
-    except HttpError as error:
-        print(f"An error occurred: {error}")
-        return []
-
-
-def get_calendar_list() -> Sequence:
-    """Gets the user's calendar list."""
-    creds = authenticate()
-    try:
-        service = build("calendar", "v3", credentials=creds)
-        calendar_list = service.calendarList().list().execute()
-        return calendar_list.get("items", [])
-
-    except HttpError as error:
-        print(f"An error occurred: {error}")
-        return []
+            items = events_result.get("items", [])
+            op["events"] = len(items)
+            return items
+
+        except HttpError as error:
+            op["error"] = str(error)
+            return []
+
+
+def get_calendar_list(
+    user_id: str | None = None, raise_errors: bool = False
+) -> Sequence:
+    """Gets the user's calendar list. With raise_errors, API errors are raised."""
+    with log_operation("get_calendar_list", api_calls=0) as op:
+        try:
+            service = get_service(user_id)
+            op["api_calls"] += 1
+            calendar_list = service.calendarList().list().execute()
+            return calendar_list.get("items", [])
+
+        except HttpError as error:
+            if raise_errors:
+                raise
+            op["error"] = str(error)
+            return []
 
 
 if __name__ == "__main__":
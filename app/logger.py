@@ -1,16 +1,101 @@
+import atexit
+import json
 import logging
+import queue
+import random
+import time
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener
 
-from app.config import Settings
+from app.config import get_settings
+
+settings = get_settings()
 
 logger = logging.getLogger(__name__)
 
+# Attributes every LogRecord has; anything else was passed in `extra`.
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats a record as one JSON object per line, including its extra fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "message": record.getMessage(),
+            "module": record.module,
+            "function": record.funcName,
+            "line": record.lineno,
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps a fraction of the records below WARNING; warnings and errors always pass."""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= logging.WARNING or random.random() < self.rate
+
+
 # the handler determines where the logs go: stdout/file
 handler = logging.StreamHandler()
 
 # the formatter determines what our logs will look like
-fmt = '%(levelname)s %(asctime)s %(filename)s %(funcName)s %(lineno)d %(message)s'
-formatter = logging.Formatter(fmt)
+if settings.log_format == "json":
+    formatter: logging.Formatter = JsonFormatter()
+else:
+    fmt = '%(levelname)s %(asctime)s %(filename)s %(funcName)s %(lineno)d %(message)s'
+    formatter = logging.Formatter(fmt)
 handler.setFormatter(formatter)
 
-logger.addHandler(handler)
-logger.setLevel(Settings().log_level)
+# Records are handed to a background thread through a queue, so writing them
+# never blocks tool calls or the chat loop.
+log_queue: queue.SimpleQueue = queue.SimpleQueue()
+queue_handler = QueueHandler(log_queue)
+queue_handler.addFilter(SamplingFilter(settings.log_sample_rate))
+listener = QueueListener(log_queue, handler)
+listener.start()
+atexit.register(listener.stop)
+
+logger.addHandler(queue_handler)
+logger.setLevel(settings.log_level)
+
+
+@contextmanager
+def log_operation(operation: str, **fields):
+    """
+    Logs one record when an operation ends, with its duration and any fields
+    set on the yielded dict (e.g. api_calls or cache_hit). Operations are
+    logged at DEBUG so they don't clutter the chat; one that raises, or sets
+    an "error" field, is logged as an error.
+    """
+    fields = {"operation": operation, **fields}
+    start = time.perf_counter()
+    try:
+        yield fields
+    except Exception as e:
+        fields["error"] = str(e)
+        raise
+    finally:
+        fields["duration_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        # Attribute the record to the function running the operation, past
+        # contextlib's __exit__.
+        if "error" in fields:
+            logger.error(
+                f"{operation} failed: {fields['error']}", extra=fields, stacklevel=3
+            )
+        else:
+            logger.debug(
+                f"{operation} took {fields['duration_ms']} ms", extra=fields, stacklevel=3
+            )
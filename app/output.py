@@ -0,0 +1,132 @@
+import json
+import sys
+from datetime import datetime
+from enum import Enum
+from typing import Iterable, TextIO
+
+from rich.table import Table
+
+
+class OutputFormat(str, Enum):
+    table = "table"
+    json = "json"
+    jsonl = "jsonl"
+    tsv = "tsv"
+
+
+EVENT_COLUMNS = ["start", "end", "all_day", "summary", "location", "id"]
+CALENDAR_COLUMNS = ["summary", "id", "description"]
+
+
+def event_row(event: dict) -> dict:
+    """Flattens an API event into the fields the listings show."""
+    start_info = event["start"]
+    end_info = event["end"]
+    return {
+        "start": start_info.get("dateTime", start_info.get("date")),
+        "end": end_info.get("dateTime", end_info.get("date")),
+        "all_day": "dateTime" not in start_info,
+        "summary": event.get("summary", ""),
+        "location": event.get("location", ""),
+        "id": event["id"],
+    }
+
+
+def calendar_row(calendar: dict) -> dict:
+    return {
+        "summary": calendar.get("summary", ""),
+        "id": calendar.get("id", ""),
+        "description": calendar.get("description", ""),
+    }
+
+
+def _tsv_field(value) -> str:
+    return str(value).replace("\t", " ").replace("\r", " ").replace("\n", " ")
+
+
+def write_rows(
+    rows: Iterable[dict],
+    output_format: OutputFormat,
+    columns: list[str],
+    out: TextIO | None = None,
+) -> int:
+    """
+    Writes rows to out (default: stdout) as they are produced, without
+    holding them in memory, and returns how many were written.
+    """
+    out = out or sys.stdout
+    count = 0
+    if output_format is OutputFormat.json:
+        out.write("[")
+        for row in rows:
+            out.write(",\n" if count else "\n")
+            out.write(json.dumps(row))
+            count += 1
+        out.write("\n]\n" if count else "]\n")
+    elif output_format is OutputFormat.jsonl:
+        for row in rows:
+            out.write(json.dumps(row) + "\n")
+            count += 1
+    elif output_format is OutputFormat.tsv:
+        out.write("\t".join(columns) + "\n")
+        for row in rows:
+            out.write("\t".join(_tsv_field(row[column]) for column in columns) + "\n")
+            count += 1
+    else:
+        raise ValueError(f"{output_format.value} output is not a row format.")
+    return count
+
+
+def events_table(events: Iterable[dict], title: str) -> Table:
+    """Builds the Rich table used to show events in the terminal."""
+    table = Table(title=title, show_header=True, header_style="bold magenta")
+    table.add_column("Start", style="dim")
+    table.add_column("End", style="dim")
+    table.add_column("Duration")
+    table.add_column("Summary")
+    table.add_column("ID", style="dim")
+
+    for event in events:
+        start_info = event["start"]
+        end_info = event["end"]
+        if "dateTime" in start_info:
+            start_dt = datetime.fromisoformat(start_info["dateTime"])
+            end_dt = datetime.fromisoformat(end_info["dateTime"])
+            duration = end_dt - start_dt
+            table.add_row(
+                start_dt.strftime("%A, %Y-%m-%d %H:%M"),
+                end_dt.strftime("%H:%M"),
+                str(duration),
+                event["summary"],
+                event["id"],
+            )
+        else:
+            table.add_row(
+                start_info["date"],
+                "",
+                "All day",
+                event["summary"],
+                event["id"],
+            )
+    return table
+
+
+def calendars_table(calendars: Iterable[dict]) -> Table:
+    """Builds the Rich table used to show calendars in the terminal."""
+    table = Table(
+        title="Available Calendars",
+        show_header=True,
+        header_style="bold magenta",
+        expand=True,
+    )
+    table.add_column("Summary")
+    table.add_column("ID", style="dim", no_wrap=True)
+    table.add_column("Description", style="dim")
+
+    for calendar in calendars:
+        table.add_row(
+            calendar.get("summary"),
+            calendar.get("id"),
+            calendar.get("description", "N/A"),
+        )
+    return table
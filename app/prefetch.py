@@ -0,0 +1,263 @@
+import datetime
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
+
+from app.config import get_settings
+from app.google_calendar import get_calendar_list, iter_events
+from app.logger import logger
+
+# How long a read waits for an in-flight prefetch before going to the API.
+PREFETCH_WAIT = 10.0
+# Changes are requested from a little before the last fetch in case the
+# clocks differ; applying a change twice is harmless.
+CLOCK_SKEW = 60.0
+# A window is refetched in full once it has slid this far, so that it keeps
+# covering the same number of days ahead.
+REANCHOR_AFTER = 86400.0
+
+
+def event_bounds(event: dict) -> tuple[datetime.datetime, datetime.datetime]:
+    """Returns an event's start and end as aware datetimes (all-day: local time)."""
+    bounds = []
+    for key in ("start", "end"):
+        info = event[key]
+        if "dateTime" in info:
+            value = datetime.datetime.fromisoformat(info["dateTime"])
+        else:
+            value = datetime.datetime.fromisoformat(info["date"]).astimezone()
+        bounds.append(value)
+    return bounds[0], bounds[1]
+
+
+def matches_query(event: dict, query: str) -> bool:
+    """
+    Approximates the API's `q` filter: every term occurs, case-insensitively,
+    in a field the API searches. Substrings match too ("stand" finds
+    "standup"), so results can differ from the API's.
+    """
+    people = [*event.get("attendees", []), event.get("organizer", {})]
+    text = " ".join(
+        [
+            event.get("summary", ""),
+            event.get("description", ""),
+            event.get("location", ""),
+            *(person.get("email", "") for person in people),
+            *(person.get("displayName", "") for person in people),
+        ]
+    ).lower()
+    return all(term in text for term in query.lower().split())
+
+
+def changed_events(calendar_id: str, since: float) -> list[dict]:
+    """
+    Returns the events of a calendar changed or deleted since a timestamp.
+    Recurring series come back as one event with a `recurrence` rule.
+    """
+    return list(
+        iter_events(
+            calendar_id,
+            order_by=None,
+            page_size=2500,
+            raise_errors=True,
+            updated_min=datetime.datetime.fromtimestamp(since - CLOCK_SKEW, datetime.UTC),
+            show_deleted=True,
+            single_events=False,
+        )
+    )
+
+
+def apply_changes(
+    events: list[dict],
+    changes: list[dict],
+    start: datetime.datetime,
+    end: datetime.datetime,
+) -> list[dict] | None:
+    """
+    Applies changed events to a listing of the events overlapping [start, end).
+    Returns None if a recurring series changed, since its instances can only
+    be listed again.
+    """
+    by_id = {event["id"]: event for event in events}
+    for event in changes:
+        if "recurrence" in event:
+            return None
+        if event.get("status") == "cancelled":
+            by_id.pop(event["id"], None)
+            continue
+        event_start, event_end = event_bounds(event)
+        if event_end > start and event_start < end:
+            by_id[event["id"]] = event
+        else:
+            # Moved out of the window.
+            by_id.pop(event["id"], None)
+    return sorted(by_id.values(), key=lambda event: event_bounds(event)[0])
+
+
+@dataclass
+class CachedWindow:
+    events: list[dict]
+    start: datetime.datetime
+    end: datetime.datetime
+    fetched_at: float
+
+
+class EventCache:
+    """
+    Holds the next few days of events for each calendar.
+    A read is served from the cache only when the cached window is known to
+    hold every event the read asks for; otherwise it is a miss and the caller
+    goes to the API. Listings are then exact, while searches filter the
+    window with matches_query(), an approximation of the API's search.
+    """
+
+    def __init__(self, days: int, ttl: float):
+        self.days = days
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._windows: dict[str, CachedWindow] = {}
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        # Reads are only served once prefetching has started.
+        self.active = False
+
+    def _fetch(self, calendar_id: str):
+        start = datetime.datetime.now(tz=datetime.UTC)
+        end = start + datetime.timedelta(days=self.days)
+        # Changes made while fetching are picked up by the next refresh.
+        fetched_at = start.timestamp()
+        try:
+            events = list(
+                iter_events(
+                    calendar_id,
+                    time_min=start,
+                    time_max=end,
+                    page_size=2500,
+                    raise_errors=True,
+                )
+            )
+        except Exception as e:
+            logger.warning(f"Prefetch of calendar {calendar_id} failed: {e}")
+            return
+        with self._lock:
+            self._windows[calendar_id] = CachedWindow(events, start, end, fetched_at)
+
+    def refresh(self, calendar_id: str = "primary"):
+        """Brings a calendar's window up to date, fetching only what changed."""
+        with self._lock:
+            window = self._windows.get(calendar_id)
+        if window is None or time.time() - window.start.timestamp() > REANCHOR_AFTER:
+            return self._fetch(calendar_id)
+        fetched_at = time.time()
+        try:
+            changes = changed_events(calendar_id, window.fetched_at)
+        except Exception as e:
+            logger.warning(f"Refreshing calendar {calendar_id} failed: {e}")
+            return
+        events = apply_changes(window.events, changes, window.start, window.end)
+        if events is None:
+            return self._fetch(calendar_id)
+        with self._lock:
+            self._windows[calendar_id] = CachedWindow(
+                events, window.start, window.end, fetched_at
+            )
+
+    def prefetch(self):
+        """Fetches the upcoming window of every calendar the user can see."""
+        try:
+            calendar_ids = ["primary"] + [
+                calendar["id"]
+                for calendar in get_calendar_list()
+                if not calendar.get("primary")
+            ]
+            with ThreadPoolExecutor(4, thread_name_prefix="prefetch") as pool:
+                list(pool.map(self._fetch, calendar_ids))
+        finally:
+            self._ready.set()
+
+    def start_prefetch(self):
+        """Starts prefetching in the background, e.g. while the user is typing."""
+        self.active = True
+        threading.Thread(target=self.prefetch, name="prefetch", daemon=True).start()
+
+    def _window(self, calendar_id: str) -> CachedWindow | None:
+        if self.active:
+            # A prefetch already in flight is still faster than a new request.
+            self._ready.wait(PREFETCH_WAIT)
+        with self._lock:
+            window = self._windows.get(calendar_id)
+        if window is None or time.time() - window.fetched_at > self.ttl:
+            return None
+        return window
+
+    def _record(self, events: list[dict] | None) -> list[dict] | None:
+        with self._lock:
+            if events is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return events
+
+    def upcoming(self, calendar_id: str, max_results: int, query: str | None = None):
+        """
+        Returns the next max_results events (optionally matching query, as
+        approximated by matches_query()), or None. Only a window holding at
+        least max_results of them is authoritative, since more matches could
+        exist beyond its end.
+        """
+        window = self._window(calendar_id)
+        if window is None:
+            return self._record(None)
+        now = datetime.datetime.now(tz=datetime.UTC)
+        events = [
+            event
+            for event in window.events
+            if event_bounds(event)[1] > now
+            and (query is None or matches_query(event, query))
+        ]
+        if len(events) < max_results:
+            return self._record(None)
+        return self._record(events[:max_results])
+
+    def between(
+        self,
+        calendar_id: str,
+        start: datetime.datetime,
+        end: datetime.datetime,
+    ) -> list[dict] | None:
+        """Returns the events overlapping [start, end) if cached in full, else None."""
+        window = self._window(calendar_id)
+        if window is None or start < window.start or end > window.end:
+            return self._record(None)
+        events = []
+        for event in window.events:
+            event_start, event_end = event_bounds(event)
+            if event_end > start and event_start < end:
+                events.append(event)
+        return self._record(events)
+
+    def invalidate(self, calendar_id: str = "primary"):
+        """Drops a calendar's window after a write and refetches it."""
+        with self._lock:
+            self._windows.pop(calendar_id, None)
+        threading.Thread(
+            target=self._fetch, args=(calendar_id,), name="prefetch", daemon=True
+        ).start()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+
+@lru_cache
+def get_event_cache() -> EventCache:
+    settings = get_settings()
+    return EventCache(settings.prefetch_days, settings.prefetch_ttl)
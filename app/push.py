@@ -0,0 +1,313 @@
+import atexit
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from dataclasses import dataclass
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Mapping
+
+from app.config import get_settings
+from app.google_calendar import get_service
+from app.logger import logger
+
+# Notifications arriving within this many seconds of each other cause one refresh.
+DEBOUNCE = 1.0
+# How often the worker checks for channels that need renewing.
+RENEW_CHECK_INTERVAL = 60.0
+
+
+@dataclass
+class Channel:
+    id: str
+    resource_id: str
+    calendar_id: str
+    token: str
+    expiration: float
+
+
+class PushManager:
+    """
+    Keeps Calendar watch channels open for a set of calendars and turns their
+    notifications into refreshes of the affected calendar.
+
+    Notifications only say that something changed, so listeners are called
+    with the calendar ID and fetch the changes themselves. Bursts of
+    notifications for one calendar are coalesced into one call, and channels
+    are replaced by new ones shortly before they expire.
+    """
+
+    def __init__(self, address: str | None, ttl: int, renew_margin: float):
+        self.address = address
+        self.ttl = ttl
+        self.renew_margin = renew_margin
+        self.notifications = 0
+        self.refreshes = 0
+        self._channels: dict[str, Channel] = {}
+        self._listeners: list[Callable[[str], None]] = []
+        self._dirty: set[str] = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def on_change(self, listener: Callable[[str], None]):
+        """Calls listener(calendar_id) after the calendar has changed."""
+        self._listeners.append(listener)
+
+    def add(self, channel: Channel):
+        with self._lock:
+            self._channels[channel.id] = channel
+
+    def channels(self) -> list[Channel]:
+        with self._lock:
+            return list(self._channels.values())
+
+    def watch(self, calendar_id: str = "primary") -> Channel:
+        """Opens a channel that sends the calendar's changes to the address."""
+        if not self.address:
+            raise ValueError("Set PUSH_ADDRESS to the public URL of the receiver.")
+        channel_id = str(uuid.uuid4())
+        token = uuid.uuid4().hex
+        response = (
+            get_service()
+            .events()
+            .watch(
+                calendarId=calendar_id,
+                body={
+                    "id": channel_id,
+                    "type": "web_hook",
+                    "address": self.address,
+                    "token": token,
+                    "params": {"ttl": str(self.ttl)},
+                },
+            )
+            .execute()
+        )
+        channel = Channel(
+            channel_id,
+            response["resourceId"],
+            calendar_id,
+            token,
+            int(response["expiration"]) / 1000,
+        )
+        self.add(channel)
+        logger.info(f"Watching calendar {calendar_id} through channel {channel_id}")
+        return channel
+
+    def _close(self, channel: Channel):
+        with self._lock:
+            self._channels.pop(channel.id, None)
+        try:
+            get_service().channels().stop(
+                body={"id": channel.id, "resourceId": channel.resource_id}
+            ).execute()
+        except Exception as e:
+            # An unstopped channel just expires.
+            logger.warning(f"Could not stop channel {channel.id}: {e}")
+
+    def renew_expiring(self):
+        """Replaces channels that expire within the renewal margin."""
+        deadline = time.time() + self.renew_margin
+        for channel in self.channels():
+            if channel.expiration > deadline:
+                continue
+            try:
+                # Open the new channel first so no change goes unnoticed.
+                self.watch(channel.calendar_id)
+            except Exception as e:
+                logger.warning(f"Renewing channel {channel.id} failed: {e}")
+                continue
+            self._close(channel)
+            # Changes may have happened while neither channel was reporting.
+            self._mark_dirty(channel.calendar_id)
+
+    def handle(self, headers: Mapping[str, str]) -> bool:
+        """
+        Handles a notification's headers and returns whether it came from one
+        of our channels.
+        """
+        with self._lock:
+            channel = self._channels.get(headers.get("X-Goog-Channel-ID", ""))
+        if (
+            channel is None
+            or headers.get("X-Goog-Channel-Token") != channel.token
+            or headers.get("X-Goog-Resource-ID") != channel.resource_id
+        ):
+            return False
+        # "sync" only confirms that a new channel works.
+        if headers.get("X-Goog-Resource-State") != "sync":
+            with self._lock:
+                self.notifications += 1
+            self._mark_dirty(channel.calendar_id)
+        return True
+
+    def _mark_dirty(self, calendar_id: str):
+        with self._lock:
+            self._dirty.add(calendar_id)
+        self._wakeup.set()
+
+    def _refresh_dirty(self):
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+        for calendar_id in dirty:
+            for listener in self._listeners:
+                try:
+                    listener(calendar_id)
+                except Exception as e:
+                    logger.warning(f"Refreshing calendar {calendar_id} failed: {e}")
+            with self._lock:
+                self.refreshes += 1
+
+    def _run(self):
+        while not self._stopped.is_set():
+            if self._wakeup.wait(RENEW_CHECK_INTERVAL):
+                self._wakeup.clear()
+                # Let the rest of a burst arrive.
+                self._stopped.wait(DEBOUNCE)
+                self._refresh_dirty()
+            if not self._stopped.is_set():
+                self.renew_expiring()
+
+    def start(self, calendar_ids: list[str] | None = None):
+        """Watches the calendars and starts handling their notifications."""
+        for calendar_id in calendar_ids or []:
+            self.watch(calendar_id)
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="push", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stops the worker and closes every channel."""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        for channel in self.channels():
+            self._close(channel)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "channels": len(self._channels),
+                "notifications": self.notifications,
+                "refreshes": self.refreshes,
+            }
+
+
+class _NotificationHandler(BaseHTTPRequestHandler):
+    server: "_NotificationServer"
+
+    def do_POST(self):
+        # Calendar notifications have no body worth reading, but drain it.
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        accepted = self.server.manager.handle(self.headers)
+        self.send_response(200 if accepted else 403)
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        logger.debug(f"Push receiver: {format % args}")
+
+
+class _NotificationServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int], manager: PushManager):
+        super().__init__(address, _NotificationHandler)
+        self.manager = manager
+
+
+class NotificationReceiver:
+    """
+    A small HTTP server for Calendar's webhook notifications. Calendar only
+    calls HTTPS addresses, so in practice it sits behind a tunnel or reverse
+    proxy whose public URL is PUSH_ADDRESS.
+    """
+
+    def __init__(self, manager: PushManager, host: str, port: int):
+        self._server = _NotificationServer((host, port), manager)
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="push-receiver", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class FakeNotifier:
+    """
+    Plays the part of Calendar for a receiver on this machine: opens channels
+    without calling the API and sends notifications with the same headers,
+    so the push pipeline can be exercised without a public address.
+    """
+
+    def __init__(self, manager: PushManager, url: str):
+        self.manager = manager
+        self.url = url
+        self._messages = 0
+
+    def open_channel(self, calendar_id: str = "primary", ttl: float = 86400) -> Channel:
+        channel = Channel(
+            str(uuid.uuid4()),
+            uuid.uuid4().hex,
+            calendar_id,
+            uuid.uuid4().hex,
+            time.time() + ttl,
+        )
+        self.manager.add(channel)
+        self.notify(channel, "sync")
+        return channel
+
+    def notify(self, channel: Channel, state: str = "exists") -> int:
+        """Sends a notification for the channel and returns the HTTP status."""
+        self._messages += 1
+        request = urllib.request.Request(
+            self.url,
+            method="POST",
+            headers={
+                "X-Goog-Channel-ID": channel.id,
+                "X-Goog-Channel-Token": channel.token,
+                "X-Goog-Channel-Expiration": time.strftime(
+                    "%a, %d %b %Y %H:%M:%S GMT", time.gmtime(channel.expiration)
+                ),
+                "X-Goog-Resource-ID": channel.resource_id,
+                "X-Goog-Resource-State": state,
+                "X-Goog-Message-Number": str(self._messages),
+            },
+        )
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+
+@lru_cache
+def get_push_manager() -> PushManager:
+    """
+    Returns the manager with its receiver running. Callers subscribe the
+    caches they keep with on_change().
+    """
+    settings = get_settings()
+    manager = PushManager(
+        settings.push_address, settings.push_channel_ttl, settings.push_renew_margin
+    )
+    receiver = NotificationReceiver(manager, settings.push_host, settings.push_port)
+    receiver.start()
+    # Stop the channels first, then the receiver they report to.
+    atexit.register(receiver.stop)
+    atexit.register(manager.stop)
+    return manager
@@ -0,0 +1,137 @@
+import datetime
+import re
+import time
+from dataclasses import dataclass
+from typing import Callable
+
+from app.google_calendar import list_events
+from app.prefetch import get_event_cache
+from app.tools import format_events, get_calendar_event, list_calendar_events
+
+# Upper bound on events fetched for a date window. The agent is told to fetch
+# 20-30 events and filter them itself; the fast path filters server-side.
+WINDOW_MAX_RESULTS = 50
+
+_WINDOW = r"(today|tomorrow|this week|next week)"
+_EVENTS = r"(?:events|meetings|appointments|schedule|calendar|agenda)"
+
+_WINDOW_PATTERNS = [
+    re.compile(
+        rf"^what(?:'s| is)(?: on)?(?: my (?:calendar|schedule))?(?: for)? {_WINDOW}$"
+    ),
+    re.compile(rf"^what(?: do i have| have i got)(?: on)?(?: for)? {_WINDOW}$"),
+    re.compile(rf"^(?:show|list|get)(?: me)?(?: my)? {_EVENTS}(?: for)? {_WINDOW}$"),
+    re.compile(rf"^{_WINDOW}(?:'s)?(?: {_EVENTS})?$"),
+]
+_NEXT_PATTERNS = [
+    re.compile(
+        rf"^(?:show|list|get|what are)(?: me)?(?: my)? next (\d+) {_EVENTS}$"
+    ),
+    re.compile(rf"^next (\d+) {_EVENTS}$"),
+]
+_GET_PATTERNS = [
+    re.compile(
+        r"^(?:get|show)(?: me)?(?: the)?(?: details (?:of|for))? event ([\w-]+)$"
+    ),
+    re.compile(r"^(?:details|info) (?:of|for|on) event ([\w-]+)$"),
+]
+
+
+def _window(name: str, now: datetime.datetime):
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    if name == "today":
+        return now, today + datetime.timedelta(days=1)
+    if name == "tomorrow":
+        start = today + datetime.timedelta(days=1)
+        return start, start + datetime.timedelta(days=1)
+    week_start = today - datetime.timedelta(days=today.weekday())
+    if name == "this week":
+        return now, week_start + datetime.timedelta(days=7)
+    start = week_start + datetime.timedelta(days=7)
+    return start, start + datetime.timedelta(days=7)
+
+
+def list_window(name: str) -> str:
+    """Lists the events in a named date window such as 'today' or 'next week'."""
+    now = datetime.datetime.now().astimezone()
+    start, end = _window(name, now)
+    events = None
+    if get_event_cache().active:
+        events = get_event_cache().between("primary", start, end)
+    if events is None:
+        events = list_events(WINDOW_MAX_RESULTS, time_min=start, time_max=end)
+    if not events:
+        return f"No events found for {name}."
+    return format_events(events, f"Events for {name}:")
+
+
+@dataclass
+class FastPathMatch:
+    name: str
+    handler: Callable[[], str]
+
+
+def match(query: str) -> FastPathMatch | None:
+    """Returns the fast path for a query, or None if it needs the agent."""
+    text = " ".join(query.lower().strip().rstrip("?.!").split())
+    text = text.replace("’", "'")
+    for pattern in _WINDOW_PATTERNS:
+        if m := pattern.match(text):
+            window = m.group(1)
+            return FastPathMatch("list_window", lambda: list_window(window))
+    for pattern in _NEXT_PATTERNS:
+        if m := pattern.match(text):
+            count = int(m.group(1))
+            return FastPathMatch("next_events", lambda: list_calendar_events(count))
+    for pattern in _GET_PATTERNS:
+        # Event IDs are case-sensitive, so take them from the original query.
+        if m := pattern.match(text):
+            event_id = query.strip().rstrip("?.!").split()[-1]
+            return FastPathMatch("get_event", lambda: get_calendar_event(event_id))
+    return None
+
+
+class FastPathRouter:
+    """Answers simple queries without the LLM and keeps hit rate and latency metrics."""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.fast_seconds = 0.0
+        self.agent_turns = 0
+        self.agent_seconds = 0.0
+
+    def try_answer(self, query: str) -> str | None:
+        """Returns the answer to query if it matches a fast path, otherwise None."""
+        fast_path = match(query)
+        if fast_path is None:
+            self.misses += 1
+            return None
+        start = time.perf_counter()
+        answer = fast_path.handler()
+        self.fast_seconds += time.perf_counter() - start
+        self.hits += 1
+        return answer
+
+    def record_agent_turn(self, seconds: float):
+        self.agent_turns += 1
+        self.agent_seconds += seconds
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        stats = {
+            "queries": total,
+            "hits": self.hits,
+            "hit_rate": self.hits / total if total else 0.0,
+            "avg_fast_seconds": self.fast_seconds / self.hits if self.hits else 0.0,
+            "avg_agent_seconds": (
+                self.agent_seconds / self.agent_turns if self.agent_turns else 0.0
+            ),
+        }
+        # Estimate what the fast-path queries would have cost through the agent.
+        stats["seconds_saved"] = (
+            self.hits * stats["avg_agent_seconds"] - self.fast_seconds
+            if self.agent_turns
+            else 0.0
+        )
+        return stats
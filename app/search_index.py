@@ -0,0 +1,445 @@
+import datetime
+import json
+import math
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from collections.abc import Mapping
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Callable
+
+from app.config import get_settings
+from app.google_calendar import iter_events
+from app.logger import logger
+from app.prefetch import REANCHOR_AFTER, apply_changes, changed_events, event_bounds
+
+# Matches in the title count for more than matches in the other fields.
+FIELD_WEIGHTS = {"summary": 3.0, "location": 1.5, "description": 1.0, "attendees": 1.0}
+# Shorter query words only match whole tokens and prefixes, not similar ones.
+MIN_FUZZY_LENGTH = 4
+FUZZY_THRESHOLD = 0.6
+# Typos like "reveiw" share too few trigrams, so words may also be one edit
+# (a swap of neighbours counts as one) away from a token, long words two.
+MAX_EDITS = 1
+LONG_WORD_LENGTH = 8
+PREFIX_SCORE = 0.9
+FUZZY_SCORE = 0.8
+# Relevance is halved for an event this many days away from now.
+RECENCY_DAYS = 30.0
+
+_WORD = re.compile(r"\S+")
+_PART = re.compile(r"[^\W_]+")
+
+
+def _squash(word: str) -> str:
+    return "".join(_PART.findall(word.lower()))
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Splits text into lowercase tokens.
+    Besides the words themselves (punctuation removed), a word's parts and
+    each pair of adjacent words joined together are tokens too, so that
+    "stand-up", "standup" and "stand up" all share the token "standup".
+    """
+    raw_words = _WORD.findall(text.lower())
+    words = [word for word in map(_squash, raw_words) if word]
+    tokens = list(words)
+    for raw in raw_words:
+        parts = _PART.findall(raw)
+        if len(parts) > 1:
+            tokens.extend(parts)
+    tokens.extend(a + b for a, b in zip(words, words[1:]))
+    return tokens
+
+
+def _trigrams(token: str) -> set[str]:
+    padded = f" {token} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def _edit_distance(a: str, b: str, limit: int) -> int:
+    """
+    The optimal string alignment distance between a and b, or limit + 1 if
+    it is larger than limit.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    before, previous = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            current[j] = min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (a[i - 1] != b[j - 1]),
+            )
+            if (
+                before is not None
+                and j > 1
+                and a[i - 1] == b[j - 2]
+                and a[i - 2] == b[j - 1]
+            ):
+                current[j] = min(current[j], before[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        before, previous = previous, current
+    return min(previous[-1], limit + 1)
+
+
+def _decode_posting(row: str) -> dict[int, float]:
+    posting = {}
+    for item in row.split():
+        i, weight = item.split(":")
+        posting[int(i)] = float(weight)
+    return posting
+
+
+class _SavedTable(Mapping):
+    """A saved table of strings whose rows are decoded when first looked up."""
+
+    def __init__(self, rows: dict[str, str], decode: Callable[[str], Any]):
+        self._rows = rows
+        self._decode = decode
+        self._decoded: dict[str, Any] = {}
+
+    def __getitem__(self, key: str):
+        if key not in self._decoded:
+            self._decoded[key] = self._decode(self._rows[key])
+        return self._decoded[key]
+
+    def __contains__(self, key) -> bool:
+        return key in self._rows
+
+    def __iter__(self):
+        return iter(self._rows)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+
+def _event_fields(event: dict) -> dict[str, str]:
+    attendees = event.get("attendees", [])
+    return {
+        "summary": event.get("summary", ""),
+        "location": event.get("location", ""),
+        "description": event.get("description", ""),
+        "attendees": " ".join(
+            f"{a.get('displayName', '')} {a.get('email', '')}" for a in attendees
+        ),
+    }
+
+
+class SearchIndex:
+    """
+    An inverted index over one calendar's events in a time window.
+    Query words match tokens exactly, by prefix, by trigram similarity or
+    within a small edit distance; results are ranked by field-weighted
+    TF-IDF and by how close the event is to now.
+    """
+
+    def __init__(
+        self,
+        events: list[dict],
+        start: datetime.datetime,
+        end: datetime.datetime,
+        built_at: float,
+        postings: Mapping[str, dict[int, float]] | None = None,
+        grams: Mapping[str, list[str]] | None = None,
+    ):
+        self.events = events
+        self.start = start
+        self.end = end
+        self.built_at = built_at
+        self._bounds = [event_bounds(event) for event in events]
+        if postings is None:
+            # token -> {event index: best field weight}
+            postings = defaultdict(dict)
+            for i, event in enumerate(events):
+                for field, text in _event_fields(event).items():
+                    weight = FIELD_WEIGHTS[field]
+                    for token in tokenize(text):
+                        posting = postings[token]
+                        if posting.get(i, 0.0) < weight:
+                            posting[i] = weight
+        self._postings = postings
+        self._vocabulary = sorted(postings)
+        if grams is None:
+            grams = defaultdict(list)
+            for token in self._vocabulary:
+                for gram in _trigrams(token):
+                    grams[gram].append(token)
+        self._grams = grams
+
+    def to_json(self) -> dict:
+        """The index as JSON-compatible data, tables included, for from_json()."""
+        return {
+            "events": self.events,
+            "start": self.start.isoformat(),
+            "end": self.end.isoformat(),
+            "built_at": self.built_at,
+            # Rows are saved as strings, which parse much faster than nested
+            # lists and are only decoded once a query looks them up.
+            "postings": {
+                token: " ".join(f"{i}:{weight:g}" for i, weight in posting.items())
+                for token, posting in self._postings.items()
+            },
+            "grams": {gram: " ".join(tokens) for gram, tokens in self._grams.items()},
+        }
+
+    @classmethod
+    def from_json(cls, entry: dict) -> "SearchIndex":
+        """
+        Loads an index saved by to_json(). Entries saved without their tables
+        are indexed again.
+        """
+        postings = grams = None
+        if "postings" in entry and "grams" in entry:
+            postings = _SavedTable(entry["postings"], _decode_posting)
+            grams = _SavedTable(entry["grams"], str.split)
+        return cls(
+            entry["events"],
+            datetime.datetime.fromisoformat(entry["start"]),
+            datetime.datetime.fromisoformat(entry["end"]),
+            entry["built_at"],
+            postings,
+            grams,
+        )
+
+    def _idf(self, token: str) -> float:
+        return math.log(1 + len(self.events) / len(self._postings[token]))
+
+    def _expand(self, word: str) -> dict[str, float]:
+        """Returns the tokens a query word matches, with how well it matches them."""
+        matches = {}
+        if word in self._postings:
+            matches[word] = 1.0
+        if len(word) >= 3:
+            i = bisect_left(self._vocabulary, word)
+            while i < len(self._vocabulary) and self._vocabulary[i].startswith(word):
+                matches.setdefault(self._vocabulary[i], PREFIX_SCORE)
+                i += 1
+        if len(word) >= MIN_FUZZY_LENGTH:
+            grams = _trigrams(word)
+            shared: dict[str, int] = defaultdict(int)
+            for gram in grams:
+                for token in self._grams.get(gram, ()):
+                    shared[token] += 1
+            max_edits = MAX_EDITS + (len(word) >= LONG_WORD_LENGTH)
+            for token, count in shared.items():
+                similarity = 2 * count / (len(grams) + len(_trigrams(token)))
+                if similarity < FUZZY_THRESHOLD:
+                    distance = _edit_distance(word, token, max_edits)
+                    if distance > max_edits:
+                        continue
+                    similarity = 1 - distance / max(len(word), len(token))
+                score = FUZZY_SCORE * similarity
+                if matches.get(token, 0.0) < score:
+                    matches[token] = score
+        return matches
+
+    def _scores(self, word: str) -> dict[int, float]:
+        scores: dict[int, float] = {}
+        for token, similarity in self._expand(word).items():
+            idf = self._idf(token)
+            for i, weight in self._postings[token].items():
+                score = similarity * idf * weight
+                if scores.get(i, 0.0) < score:
+                    scores[i] = score
+        return scores
+
+    def search(
+        self,
+        query: str,
+        max_results: int = 10,
+        start: datetime.datetime | None = None,
+        end: datetime.datetime | None = None,
+    ) -> list[dict]:
+        """
+        Returns the best max_results events matching every word of query that
+        overlap [start, end) (default: from now on), best first.
+        """
+        words = [word for word in map(_squash, _WORD.findall(query)) if word]
+        if not words:
+            return []
+        word_scores = [self._scores(word) for word in words]
+        # A word written separately in the query may be joined in the event
+        # ("stand up" vs "standup"), so adjacent words can match together.
+        for i in range(len(words) - 1):
+            joined = self._scores(words[i] + words[i + 1])
+            for scores in (word_scores[i], word_scores[i + 1]):
+                for event, score in joined.items():
+                    if scores.get(event, 0.0) < score:
+                        scores[event] = score
+
+        candidates = set.intersection(*(set(scores) for scores in word_scores))
+        now = datetime.datetime.now(tz=datetime.UTC)
+        start = start or now
+        ranked = []
+        for i in candidates:
+            event_start, event_end = self._bounds[i]
+            if event_end <= start or (end is not None and event_start >= end):
+                continue
+            days_away = abs((event_start - now).total_seconds()) / 86400
+            recency = 1 / (1 + days_away / RECENCY_DAYS)
+            relevance = sum(scores[i] for scores in word_scores)
+            ranked.append((-relevance * recency, event_start, i))
+        ranked.sort()
+        return [self.events[i] for _, _, i in ranked[:max_results]]
+
+
+class EventIndex:
+    """
+    Search indexes for each calendar, kept on disk so that short-lived
+    commands can use them too. An index older than ttl is stale and not
+    used until it is refreshed. The file holds each index's tables, and a
+    calendar's index is only loaded from them when it is first used.
+    """
+
+    def __init__(self, path: Path, past_days: int, days: int, ttl: float):
+        self.path = path
+        self.past_days = past_days
+        self.days = days
+        self.ttl = ttl
+        self._indexes: dict[str, SearchIndex] | None = None
+        # The file's entries; an index is only loaded from its entry when used.
+        self._saved: dict[str, dict] = {}
+        self._refreshing: set[str] = set()
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    def _load(self) -> dict[str, SearchIndex]:
+        if self._indexes is None:
+            self._indexes = {}
+            try:
+                self._saved = json.loads(self.path.read_text())
+            except (OSError, ValueError):
+                self._saved = {}
+        return self._indexes
+
+    def _index(self, calendar_id: str) -> SearchIndex | None:
+        indexes = self._load()
+        if calendar_id not in indexes and calendar_id in self._saved:
+            indexes[calendar_id] = SearchIndex.from_json(self._saved[calendar_id])
+        return indexes.get(calendar_id)
+
+    def _save(self):
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(f".{os.getpid()}.tmp")
+            tmp_path.write_text(json.dumps(self._saved))
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Could not save the search index: {e}")
+
+    def get(self, calendar_id: str = "primary") -> SearchIndex | None:
+        """Returns the calendar's index if it is fresh, else None."""
+        with self._lock:
+            index = self._index(calendar_id)
+        if index is None or time.time() - index.built_at > self.ttl:
+            return None
+        return index
+
+    def refresh(self, calendar_id: str = "primary") -> SearchIndex:
+        """
+        Brings the calendar's index up to date. While the index window is
+        recent only the changed events are fetched, otherwise all of them.
+        """
+        with self._refresh_lock:
+            return self._refresh(calendar_id)
+
+    def _refresh(self, calendar_id: str) -> SearchIndex:
+        with self._lock:
+            current = self._index(calendar_id)
+        fetched_at = time.time()
+        index = None
+        if current is not None and (
+            fetched_at - current.start.timestamp()
+            < self.past_days * 86400 + REANCHOR_AFTER
+        ):
+            changes = changed_events(calendar_id, current.built_at)
+            events = apply_changes(current.events, changes, current.start, current.end)
+            if events is not None:
+                index = SearchIndex(events, current.start, current.end, fetched_at)
+        if index is None:
+            now = datetime.datetime.fromtimestamp(fetched_at, datetime.UTC)
+            start = now - datetime.timedelta(days=self.past_days)
+            end = now + datetime.timedelta(days=self.days)
+            events = list(
+                iter_events(
+                    calendar_id,
+                    time_min=start,
+                    time_max=end,
+                    page_size=2500,
+                    raise_errors=True,
+                )
+            )
+            index = SearchIndex(events, start, end, fetched_at)
+        with self._lock:
+            self._load()[calendar_id] = index
+            self._saved[calendar_id] = index.to_json()
+            self._save()
+        return index
+
+    def refresh_in_background(self, calendar_id: str = "primary"):
+        """Rebuilds the calendar's index in a background thread, once at a time."""
+        with self._lock:
+            if calendar_id in self._refreshing:
+                return
+            self._refreshing.add(calendar_id)
+
+        def run():
+            try:
+                self.refresh(calendar_id)
+            except Exception as e:
+                logger.warning(f"Refreshing the search index of {calendar_id} failed: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(calendar_id)
+
+        threading.Thread(target=run, name="search-index", daemon=True).start()
+
+    def invalidate(self, calendar_id: str = "primary", refresh: bool = False):
+        """Drops the calendar's index after a write, optionally rebuilding it."""
+        with self._lock:
+            self._load().pop(calendar_id, None)
+            if self._saved.pop(calendar_id, None) is not None:
+                self._save()
+        if refresh:
+            self.refresh_in_background(calendar_id)
+
+    def search(
+        self,
+        query: str,
+        max_results: int = 10,
+        calendar_id: str = "primary",
+        start: datetime.datetime | None = None,
+        end: datetime.datetime | None = None,
+    ) -> list[dict] | None:
+        """
+        Returns ranked matches from the calendar's index, or None if the index
+        is stale or doesn't cover [start, end). An open end is searched up to
+        the end of the index window.
+        """
+        index = self.get(calendar_id)
+        if index is None:
+            return None
+        start = start or datetime.datetime.now(tz=datetime.UTC)
+        if start < index.start or (end is not None and end > index.end):
+            return None
+        return index.search(query, max_results, start, end)
+
+
+@lru_cache
+def get_search_index() -> EventIndex:
+    settings = get_settings()
+    return EventIndex(
+        settings.search_index_file,
+        settings.search_index_past_days,
+        settings.search_index_days,
+        settings.search_index_ttl,
+    )
@@ -0,0 +1,113 @@
+import json
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+from pathlib import Path
+
+from langchain_core.messages import (
+    BaseMessage,
+    HumanMessage,
+    ToolMessage,
+    message_to_dict,
+    messages_from_dict,
+)
+
+from app.config import get_settings
+
+
+class SessionStore:
+    """
+    Append-only SQLite store for chat histories.
+    Each turn only inserts its new messages, and loading reads just the most
+    recent history_limit messages, so long sessions stay cheap to save and resume.
+    """
+
+    def __init__(self, path: Path, history_limit: int, tool_result_chars: int):
+        self.history_limit = history_limit
+        self.tool_result_chars = tool_result_chars
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS messages ("
+                "session TEXT NOT NULL, seq INTEGER NOT NULL, "
+                "created_at REAL NOT NULL, payload TEXT NOT NULL, "
+                "PRIMARY KEY (session, seq)) WITHOUT ROWID"
+            )
+
+    def _compact(self, message: BaseMessage) -> BaseMessage:
+        # Old tool results are rarely needed verbatim; keep their start so the
+        # model still sees what was fetched.
+        if (
+            isinstance(message, ToolMessage)
+            and isinstance(message.content, str)
+            and len(message.content) > self.tool_result_chars
+        ):
+            content = message.content[: self.tool_result_chars] + "\n[truncated]"
+            return message.model_copy(update={"content": content})
+        return message
+
+    def append(self, session: str, messages: list[BaseMessage]):
+        """Appends the messages of one turn to a session."""
+        if not messages:
+            return
+        now = time.time()
+        with self._lock, self._conn:
+            (last,) = self._conn.execute(
+                "SELECT COALESCE(MAX(seq), 0) FROM messages WHERE session = ?",
+                (session,),
+            ).fetchone()
+            self._conn.executemany(
+                "INSERT INTO messages (session, seq, created_at, payload) "
+                "VALUES (?, ?, ?, ?)",
+                [
+                    (
+                        session,
+                        last + i,
+                        now,
+                        json.dumps(message_to_dict(self._compact(message))),
+                    )
+                    for i, message in enumerate(messages, start=1)
+                ],
+            )
+
+    def load(self, session: str) -> list[BaseMessage]:
+        """Loads the recent history of a session, starting at a user message."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT payload FROM messages WHERE session = ? "
+                "ORDER BY seq DESC LIMIT ?",
+                (session, self.history_limit),
+            ).fetchall()
+        messages = messages_from_dict([json.loads(row[0]) for row in reversed(rows)])
+        # A cut in the middle of a turn would leave tool results without the
+        # tool calls that produced them.
+        for i, message in enumerate(messages):
+            if isinstance(message, HumanMessage):
+                return messages[i:]
+        return []
+
+    def sessions(self) -> list[tuple[str, int, float]]:
+        """Returns (name, message count, last updated) for every session."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT session, COUNT(*), MAX(created_at) FROM messages "
+                "GROUP BY session ORDER BY MAX(created_at) DESC"
+            ).fetchall()
+
+    def delete(self, session: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM messages WHERE session = ?", (session,))
+
+
+@lru_cache
+def get_session_store() -> SessionStore:
+    settings = get_settings()
+    return SessionStore(
+        settings.session_db,
+        settings.session_history_limit,
+        settings.session_tool_result_chars,
+    )
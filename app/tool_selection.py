@@ -0,0 +1,101 @@
+import re
+
+from langchain.agents.middleware import AgentMiddleware, ModelRequest
+from langchain_core.messages import AIMessage, HumanMessage
+
+# Keywords that signal which tools a message needs. A message matching none of
+# them (e.g. "yes, go ahead") gets the full tool set.
+_TIME = (
+    r"today|tonight|tomorrow|yesterday|week|weekend|month|year|morning|afternoon"
+    r"|evening|now|date|time|when|next|last|monday|tuesday|wednesday|thursday"
+    r"|friday|saturday|sunday|\d{1,2}(?::\d{2})?\s*(?:am|pm)"
+)
+TOOL_KEYWORDS: dict[str, str] = {
+    "get_current_time": _TIME,
+    "list_calendar_events": (
+        r"list|show|what'?s|upcoming|agenda|schedule|calendar|events?|meetings?"
+        r"|free|busy|available|plans?"
+    ),
+    "search_calendar_events": (
+        r"find|search|look(?:ing)? for|where|called|named|about|titled"
+    ),
+    "get_calendar_event": (
+        r"details?|info|description|attendees?|attending|location|who"
+    ),
+    "create_calendar_event": (
+        r"create|schedule|add|book|set up|new|invite|plan|arrange|put"
+    ),
+    "update_calendar_event": (
+        r"update|change|move|reschedule|rename|edit|modify|postpone|push|shift"
+        r"|extend|shorten"
+    ),
+    "delete_calendar_event": r"delete|cancel|remove|clear|drop",
+    "get_calendars": r"calendars|which calendar|calendar ids?|shared",
+    "get_calendar_analytics": (
+        r"how (?:much|many)|hours|stats?|statistics|analytics|summary|summari[sz]e"
+        r"|average|total|busiest|most|often|spend|spent|overlap"
+    ),
+}
+# Tools that take an event ID need a way to look the ID up, and new events
+# usually need today's date.
+COMPANIONS: dict[str, set[str]] = {
+    "get_calendar_event": {"list_calendar_events", "search_calendar_events"},
+    "update_calendar_event": {
+        "get_current_time",
+        "list_calendar_events",
+        "search_calendar_events",
+    },
+    "delete_calendar_event": {"list_calendar_events", "search_calendar_events"},
+    "create_calendar_event": {"get_current_time"},
+}
+_PATTERNS = {
+    name: re.compile(rf"\b(?:{keywords})\b", re.IGNORECASE)
+    for name, keywords in TOOL_KEYWORDS.items()
+}
+
+
+def select_tool_names(message: str) -> set[str] | None:
+    """Returns the names of the tools a message is likely to need, or None for all."""
+    names = {name for name, pattern in _PATTERNS.items() if pattern.search(message)}
+    for name in list(names):
+        names |= COMPANIONS.get(name, set())
+    return names or None
+
+
+def _message_text(message: HumanMessage) -> str:
+    if isinstance(message.content, str):
+        return message.content
+    return " ".join(
+        block.get("text", "") if isinstance(block, dict) else str(block)
+        for block in message.content
+    )
+
+
+class ToolSelectionMiddleware(AgentMiddleware):
+    """
+    Binds only the tools relevant to the latest user message.
+    Tools the model already called since that message stay bound, so a
+    multi-step turn never loses a tool it is using.
+    """
+
+    def modify_model_request(
+        self, request: ModelRequest, state, runtime
+    ) -> ModelRequest:
+        used: set[str] = set()
+        for message in reversed(request.messages):
+            if isinstance(message, HumanMessage):
+                selected = select_tool_names(_message_text(message))
+                break
+            if isinstance(message, AIMessage):
+                used.update(call["name"] for call in message.tool_calls)
+        else:
+            return request
+        if selected is None:
+            return request
+        selected |= used
+        request.tools = [
+            tool
+            for tool in request.tools
+            if isinstance(tool, dict) or tool.name in selected
+        ]
+        return request
@@ -1,15 +1,25 @@
 import datetime
 from typing import Annotated
 
+from app.analytics import fetch_event_arrays, format_summary, summarize
+from app.caches import invalidate_caches
+from app.config import get_settings
 from app.google_calendar import (
     create_event,
     delete_event,
+    event_fields,
     get_calendar_list,
     get_event,
     list_events,
     search_events,
     update_event,
 )
+from app.logger import log_operation
+from app.prefetch import get_event_cache
+from app.search_index import get_search_index
+from app.write_queue import get_write_queue
+
+settings = get_settings()
 
 
 def get_tools():
@@ -22,6 +32,7 @@ def get_tools():
         update_calendar_event,
         delete_calendar_event,
         get_calendars,
+        get_calendar_analytics,
     ]
 
 
@@ -45,11 +56,23 @@ def list_calendar_events(
     Use this when the user asks to see their upcoming events, schedule, or what's on their calendar.
     Returns a list of events with their start times, end times, and summaries.
     """
-    events = list_events(max_results, calendar_id)
+    with log_operation(
+        "list_calendar_events", calendar_id=calendar_id, cache_hit=False
+    ) as op:
+        events = None
+        if get_event_cache().active:
+            events = get_event_cache().upcoming(calendar_id, max_results)
+            op["cache_hit"] = events is not None
+        if events is None:
+            events = list_events(max_results, calendar_id)
     if not events:
         return "No upcoming events found."
-    
-    result = ["Upcoming events:\n"]
+    return format_events(events, "Upcoming events:")
+
+
+def format_events(events, header: str) -> str:
+    """Formats events with their dates, times and IDs for the agent."""
+    result = [f"{header}\n"]
     for event in events:
         start_info = event["start"]
         end_info = event["end"]
@@ -68,7 +91,7 @@ def list_calendar_events(
                 f"  Date: {start_info['date']} (All-day)\n"
                 f"  ID: {event['id']}\n"
             )
-    
+
     return "\n".join(result)
 
 
@@ -80,9 +103,24 @@ def search_calendar_events(
     """
     Searches for events on the user's calendar by keyword.
     Use this when the user asks to find specific events or meetings.
-    Returns a list of matching events.
+    Returns a list of matching events, best matches first.
     """
-    events = search_events(query, max_results=max_results, calendar_id=calendar_id)
+    with log_operation(
+        "search_calendar_events", calendar_id=calendar_id, cache_hit=False
+    ) as op:
+        events = None
+        if settings.search_index:
+            index = get_search_index()
+            events = index.search(query, max_results, calendar_id)
+            if events is None:
+                index.refresh_in_background(calendar_id)
+        if events is None and get_event_cache().active:
+            events = get_event_cache().upcoming(calendar_id, max_results, query=query)
+        op["cache_hit"] = events is not None
+        if events is None:
+            events = search_events(
+                query, max_results=max_results, calendar_id=calendar_id
+            )
     if not events:
         return f"No events found matching '{query}'."
     
@@ -116,6 +154,8 @@ def get_calendar_event(
     Use this when the user asks for more information about a particular event.
     Requires the event ID which can be obtained from list_calendar_events or search_calendar_events.
     """
+    if settings.write_behind:
+        event_id = get_write_queue().resolve(event_id)
     event = get_event(event_id, calendar_id)
     if not event:
         return f"Event with ID {event_id} not found."
@@ -157,7 +197,22 @@ def create_calendar_event(
     try:
         start_dt = datetime.datetime.fromisoformat(start_time)
         end_dt = datetime.datetime.fromisoformat(end_time)
+        if settings.write_behind:
+            body = event_fields(
+                summary=summary,
+                start_time=start_dt,
+                end_time=end_dt,
+                description=description,
+                location=location,
+                attendees=attendees,
+            )
+            local_id = get_write_queue().create(body)
+            return (
+                f"Queued event '{summary}' from {start_time} to {end_time} "
+                f"(ID: {local_id}). It will be saved to the calendar shortly."
+            )
         create_event(summary, start_dt, end_dt, description, location, attendees)
+        invalidate_caches()
         return f"Successfully created event '{summary}' from {start_time} to {end_time}."
     except Exception as e:
         return f"Error creating event: {str(e)}"
@@ -188,8 +243,12 @@ def update_calendar_event(
             kwargs["description"] = description
         if location:
             kwargs["location"] = location
-        
+
+        if settings.write_behind:
+            get_write_queue().update(event_id, event_fields(**kwargs))
+            return f"Queued update of event {event_id}."
         update_event(event_id, **kwargs)
+        invalidate_caches()
         return f"Successfully updated event {event_id}."
     except Exception as e:
         return f"Error updating event: {str(e)}"
@@ -204,7 +263,11 @@ def delete_calendar_event(
     This action cannot be undone.
     """
     try:
+        if settings.write_behind:
+            get_write_queue().delete(event_id)
+            return f"Queued deletion of event {event_id}."
         delete_event(event_id)
+        invalidate_caches()
         return f"Successfully deleted event {event_id}."
     except Exception as e:
         return f"Error deleting event: {str(e)}"
@@ -223,4 +286,20 @@ def get_calendars() -> str:
     for calendar in calendars:
         result.append(f"- {calendar.get('summary')} (ID: {calendar.get('id')})")
     
-    return "\n".join(result)
\ No newline at end of file
+    return "\n".join(result)
+
+
+def get_calendar_analytics(
+    days: Annotated[int, "How many past days to analyse"] = 90,
+    calendar_id: Annotated[str, "The ID of the calendar to analyse"] = "primary",
+) -> str:
+    """
+    Summarises the user's meetings over the past days: total and weekly meeting hours,
+    average meeting length, busiest weekdays and dates, and who they meet with most.
+    Use this for questions about how time is spent, instead of listing many events.
+    """
+    try:
+        arrays = fetch_event_arrays([calendar_id], days)
+    except Exception as e:
+        return f"Error getting calendar analytics: {str(e)}"
+    return format_summary(summarize(arrays), days)
@@ -0,0 +1,288 @@
+import atexit
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable
+
+from app.caches import invalidate_caches
+from app.config import get_settings
+from app.google_calendar import get_service
+from app.logger import logger
+
+LOCAL_ID_PREFIX = "local-"
+
+
+class WriteQueue:
+    """
+    A durable, coalescing write-behind queue for event mutations.
+
+    Writes are stored in SQLite and acknowledged immediately; a background
+    thread sends them to the Calendar API in batches. While a write is still
+    queued, later writes to the same event are merged into it: several updates
+    become one PATCH, an update of a queued create becomes part of the insert,
+    and deleting a queued create drops both. Events created through the queue
+    get a local ID until they are flushed.
+    """
+
+    def __init__(self, path: Path, batch_size: int, interval: float):
+        self.batch_size = batch_size
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._listeners: list[Callable[[str], None]] = []
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        with self._conn:
+            self._conn.executescript(
+                "CREATE TABLE IF NOT EXISTS pending ("
+                "seq INTEGER PRIMARY KEY AUTOINCREMENT, calendar_id TEXT NOT NULL, "
+                "event_id TEXT NOT NULL, op TEXT NOT NULL, body TEXT NOT NULL, "
+                "inflight INTEGER NOT NULL DEFAULT 0);"
+                "CREATE TABLE IF NOT EXISTS failures ("
+                "seq INTEGER PRIMARY KEY AUTOINCREMENT, message TEXT NOT NULL);"
+                "CREATE TABLE IF NOT EXISTS local_ids ("
+                "local_id TEXT PRIMARY KEY, event_id TEXT NOT NULL);"
+            )
+            # Writes that were in flight when the process died are retried.
+            self._conn.execute("UPDATE pending SET inflight = 0")
+
+    def on_write(self, listener: Callable[[str], None]):
+        """Calls listener(calendar_id) after a flush changed the calendar."""
+        self._listeners.append(listener)
+
+    def resolve(self, event_id: str) -> str:
+        """Returns the Calendar ID for a local ID once its create has been flushed."""
+        if not event_id.startswith(LOCAL_ID_PREFIX):
+            return event_id
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT event_id FROM local_ids WHERE local_id = ?", (event_id,)
+            ).fetchone()
+        return row[0] if row else event_id
+
+    def _queued(self, calendar_id: str, event_id: str):
+        # Only writes that haven't been picked up by a flush can be merged.
+        return self._conn.execute(
+            "SELECT seq, op, body FROM pending "
+            "WHERE calendar_id = ? AND event_id = ? AND inflight = 0",
+            (calendar_id, event_id),
+        ).fetchone()
+
+    def _insert(self, calendar_id: str, event_id: str, op: str, body: dict):
+        self._conn.execute(
+            "INSERT INTO pending (calendar_id, event_id, op, body) "
+            "VALUES (?, ?, ?, ?)",
+            (calendar_id, event_id, op, json.dumps(body)),
+        )
+
+    def create(self, body: dict, calendar_id: str = "primary") -> str:
+        """Queues an event insert and returns the event's local ID."""
+        local_id = f"{LOCAL_ID_PREFIX}{uuid.uuid4().hex}"
+        with self._lock, self._conn:
+            self._insert(calendar_id, local_id, "create", body)
+        self._wakeup.set()
+        return local_id
+
+    def update(self, event_id: str, fields: dict, calendar_id: str = "primary"):
+        """Queues a partial update, merged into any queued write of the event."""
+        event_id = self.resolve(event_id)
+        with self._lock, self._conn:
+            queued = self._queued(calendar_id, event_id)
+            if queued is None:
+                self._insert(calendar_id, event_id, "update", fields)
+            elif queued[1] == "delete":
+                raise ValueError(f"Event {event_id} is queued for deletion.")
+            else:
+                body = json.loads(queued[2]) | fields
+                self._conn.execute(
+                    "UPDATE pending SET body = ? WHERE seq = ?",
+                    (json.dumps(body), queued[0]),
+                )
+        self._wakeup.set()
+
+    def delete(self, event_id: str, calendar_id: str = "primary"):
+        """Queues a delete. Deleting a still-queued create drops both."""
+        event_id = self.resolve(event_id)
+        with self._lock, self._conn:
+            queued = self._queued(calendar_id, event_id)
+            if queued is None:
+                self._insert(calendar_id, event_id, "delete", {})
+            elif queued[1] == "create":
+                self._conn.execute("DELETE FROM pending WHERE seq = ?", (queued[0],))
+            elif queued[1] == "update":
+                self._conn.execute(
+                    "UPDATE pending SET op = 'delete', body = '{}' WHERE seq = ?",
+                    (queued[0],),
+                )
+        self._wakeup.set()
+
+    def pending(self) -> int:
+        with self._lock:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM pending").fetchone()
+        return count
+
+    def _fail(self, seq: int, message: str):
+        self._conn.execute("DELETE FROM pending WHERE seq = ?", (seq,))
+        self._conn.execute("INSERT INTO failures (message) VALUES (?)", (message,))
+
+    def pop_failures(self) -> list[str]:
+        """Returns and clears the writes that failed since the last call."""
+        with self._lock, self._conn:
+            rows = self._conn.execute(
+                "SELECT seq, message FROM failures ORDER BY seq"
+            ).fetchall()
+            self._conn.execute("DELETE FROM failures")
+        return [message for _, message in rows]
+
+    def _take_batch(self) -> list[tuple]:
+        with self._lock, self._conn:
+            rows = self._conn.execute(
+                "SELECT seq, calendar_id, event_id, op, body FROM pending "
+                "WHERE inflight = 0 ORDER BY seq LIMIT ?",
+                (self.batch_size,),
+            ).fetchall()
+            batch = []
+            for seq, calendar_id, event_id, op, body in rows:
+                if op != "create" and event_id.startswith(LOCAL_ID_PREFIX):
+                    event_id, error = self._resolve_queued(event_id)
+                    if error:
+                        self._fail(seq, f"Failed to {op} event {event_id}: {error}")
+                    if event_id is None or error:
+                        continue
+                self._conn.execute(
+                    "UPDATE pending SET inflight = 1 WHERE seq = ?", (seq,)
+                )
+                batch.append((seq, calendar_id, event_id, op, json.loads(body)))
+        return batch
+
+    def _resolve_queued(self, local_id: str) -> tuple[str | None, str | None]:
+        # Writes to an event created through the queue need its real ID, which
+        # only exists once the create has gone through.
+        row = self._conn.execute(
+            "SELECT event_id FROM local_ids WHERE local_id = ?", (local_id,)
+        ).fetchone()
+        if row:
+            return row[0], None
+        creating = self._conn.execute(
+            "SELECT 1 FROM pending WHERE event_id = ? AND op = 'create'", (local_id,)
+        ).fetchone()
+        if creating:
+            return None, None
+        return local_id, "it was never created"
+
+    def flush(self) -> int:
+        """Sends queued writes to the Calendar API, returning how many were sent."""
+        sent = 0
+        with self._flush_lock:
+            while batch := self._take_batch():
+                self._send(batch)
+                sent += len(batch)
+        return sent
+
+    def _send(self, batch: list[tuple]):
+        service = get_service()
+        ops = {
+            str(seq): (seq, calendar_id, event_id, op)
+            for seq, calendar_id, event_id, op, _ in batch
+        }
+        changed: set[str] = set()
+
+        def callback(request_id, response, exception):
+            seq, calendar_id, event_id, op = ops[request_id]
+            with self._lock, self._conn:
+                if exception is not None:
+                    self._fail(seq, f"Failed to {op} event {event_id}: {exception}")
+                    return
+                changed.add(calendar_id)
+                if op == "create":
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO local_ids VALUES (?, ?)",
+                        (event_id, response["id"]),
+                    )
+                self._conn.execute("DELETE FROM pending WHERE seq = ?", (seq,))
+
+        request = service.new_batch_http_request(callback=callback)
+        for seq, calendar_id, event_id, op, body in batch:
+            if op == "create":
+                call = service.events().insert(calendarId=calendar_id, body=body)
+            elif op == "update":
+                call = service.events().patch(
+                    calendarId=calendar_id, eventId=event_id, body=body
+                )
+            else:
+                call = service.events().delete(
+                    calendarId=calendar_id, eventId=event_id
+                )
+            request.add(call, request_id=str(seq))
+        try:
+            request.execute()
+        except Exception as e:
+            # The whole batch failed to send; leave it queued for the next flush.
+            logger.warning(f"Write queue flush failed: {e}")
+            with self._lock, self._conn:
+                self._conn.executemany(
+                    "UPDATE pending SET inflight = 0 WHERE seq = ?",
+                    [(seq,) for seq, _, _, _ in ops.values()],
+                )
+            raise
+        finally:
+            # Some writes may have landed even if the batch failed midway.
+            for calendar_id in changed:
+                for listener in self._listeners:
+                    try:
+                        listener(calendar_id)
+                    except Exception as e:
+                        logger.warning(
+                            f"Write queue listener failed for {calendar_id}: {e}"
+                        )
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            # Give rapid successive edits a moment to coalesce.
+            time.sleep(min(self.interval, 0.5))
+            try:
+                self.flush()
+            except Exception:
+                self._stopped.wait(self.interval)
+
+    def start(self):
+        """Starts flushing in a background thread."""
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name="write-queue", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self):
+        """Stops the background thread and flushes what is left."""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+
+@lru_cache
+def get_write_queue() -> WriteQueue:
+    settings = get_settings()
+    queue = WriteQueue(
+        settings.write_queue_db,
+        settings.write_queue_batch_size,
+        settings.write_queue_interval,
+    )
+    # Cached reads of a calendar must not outlive a flushed write to it.
+    queue.on_write(invalidate_caches)
+    queue.start()
+    # Don't lose acknowledged writes when the process exits.
+    atexit.register(queue.stop)
+    return queue
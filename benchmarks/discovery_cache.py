@@ -0,0 +1,64 @@
+"""
+Measures Calendar client construction in fresh processes, the way a short
+`cal` command pays for it.
+
+    python -m benchmarks.discovery_cache [RUNS]
+
+Each run starts a new interpreter and times three cases: googleapiclient's
+build(), build_from_document() with a cold disk cache (parse and write) and
+with a warm one. Import time (including the app modules for the cache cases)
+is reported separately since no cache can avoid it.
+"""
+
+import json
+import statistics
+import subprocess
+import sys
+
+CHILD = """
+import json, time
+start = time.perf_counter()
+from google.auth.credentials import AnonymousCredentials
+from googleapiclient.discovery import build, build_from_document
+imported = time.perf_counter()
+creds = AnonymousCredentials()
+if "{mode}" == "build":
+    build("calendar", "v3", credentials=creds)
+else:
+    from app.config import get_settings
+    from app.discovery import clear_discovery_cache, load_discovery_document
+    get_settings()  # already loaded by the time a real command builds a client
+    if "{mode}" == "cold":
+        clear_discovery_cache()
+    imported = time.perf_counter()
+    build_from_document(load_discovery_document(), credentials=creds)
+done = time.perf_counter()
+print(json.dumps({{"import": imported - start, "construct": done - imported}}))
+"""
+
+
+def _run(mode: str) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD.format(mode=mode)],
+        capture_output=True,
+        check=True,
+        text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(runs: int):
+    print(f"{'case':22} {'import ms':>10} {'construct ms':>13}")
+    for mode, label in [
+        ("build", "build()"),
+        ("cold", "disk cache, cold"),
+        ("warm", "disk cache, warm"),
+    ]:
+        results = [_run(mode) for _ in range(runs)]
+        imported = statistics.median(r["import"] for r in results) * 1000
+        construct = statistics.median(r["construct"] for r in results) * 1000
+        print(f"{label:22} {imported:>10.1f} {construct:>13.2f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
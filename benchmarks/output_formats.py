@@ -0,0 +1,68 @@
+"""
+Compares how long `cal list` takes to render a large listing in each output
+format, and how much memory it needs while doing so.
+
+    python -m benchmarks.output_formats [EVENTS]
+
+Events are synthetic and produced one at a time, like pages arriving from the
+API; output goes to /dev/null so terminal speed doesn't count. Peak memory is
+measured in a separate run with tracemalloc, which slows the code it traces.
+"""
+
+import datetime
+import os
+import sys
+import time
+import tracemalloc
+
+from rich.console import Console
+
+from app.output import (
+    EVENT_COLUMNS,
+    OutputFormat,
+    event_row,
+    events_table,
+    write_rows,
+)
+
+
+def _events(count: int):
+    start = datetime.datetime(2025, 1, 6, 9, tzinfo=datetime.UTC)
+    for i in range(count):
+        event_start = start + datetime.timedelta(minutes=30 * i)
+        yield {
+            "id": f"event{i:08d}",
+            "summary": f"Meeting {i} about the quarterly roadmap",
+            "location": "Room 4.12",
+            "start": {"dateTime": event_start.isoformat()},
+            "end": {
+                "dateTime": (event_start + datetime.timedelta(minutes=30)).isoformat()
+            },
+        }
+
+
+def _render(output_format: OutputFormat, count: int, out):
+    if output_format is OutputFormat.table:
+        Console(file=out, width=160).print(events_table(_events(count), "Events"))
+    else:
+        write_rows(map(event_row, _events(count)), output_format, EVENT_COLUMNS, out)
+
+
+def main(count: int):
+    print(f"{count} events")
+    print(f"{'format':8} {'time ms':>10} {'peak MiB':>10}")
+    with open(os.devnull, "w") as out:
+        for output_format in OutputFormat:
+            start = time.perf_counter()
+            _render(output_format, count, out)
+            elapsed = (time.perf_counter() - start) * 1000
+
+            tracemalloc.start()
+            _render(output_format, count, out)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"{output_format.value:8} {elapsed:>10.1f} {peak / 2**20:>10.2f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000)
@@ -0,0 +1,105 @@
+"""
+Compares the full tool set with the per-message subset picked by
+ToolSelectionMiddleware.
+
+    python -m benchmarks.tool_selection          # schema size estimates, offline
+    python -m benchmarks.tool_selection --live   # real input tokens and time to
+                                                 # first tool call (needs API access)
+"""
+
+import json
+import sys
+import time
+
+from app.context_cache import get_tool_schemas
+from app.tool_selection import select_tool_names
+from app.tools import get_tools
+
+QUERIES = [
+    "What's on my calendar tomorrow?",
+    "Find the standup meeting",
+    "Schedule lunch with Sam on Friday at 12pm",
+    "Move the design review to 3pm",
+    "Cancel my dentist appointment",
+    "Which calendars do I have?",
+    "Who is attending the planning session?",
+    "Yes, go ahead",
+]
+
+
+def _schema_chars(names: set[str] | None) -> int:
+    schemas = get_tool_schemas(tuple(get_tools()))
+    return sum(
+        len(json.dumps(schema))
+        for schema in schemas
+        if names is None or schema["function"]["name"] in names
+    )
+
+
+def offline():
+    full = _schema_chars(None)
+    print(f"{'query':45} {'tools':>5} {'~tokens':>8} {'saved':>6} {'select µs':>9}")
+    total_selected = 0
+    for query in QUERIES:
+        start = time.perf_counter()
+        names = select_tool_names(query)
+        elapsed = (time.perf_counter() - start) * 1e6
+        chars = _schema_chars(names)
+        total_selected += chars
+        count = len(names) if names else len(get_tools())
+        # ~4 characters per token is a rough estimate for JSON schemas.
+        print(
+            f"{query[:45]:45} {count:>5} {chars // 4:>8} "
+            f"{1 - chars / full:>6.0%} {elapsed:>9.1f}"
+        )
+    average = total_selected / len(QUERIES)
+    print(f"\nFull tool set: ~{full // 4} tokens per model call")
+    print(
+        f"Average with selection: ~{average // 4:.0f} tokens "
+        f"({1 - average / full:.0%} less)"
+    )
+
+
+def live():
+    from langchain.agents import create_agent
+
+    from app.agent import model, tools
+    from app.context_cache import PrefixCacheMiddleware
+    from app.prompt import prompt
+    from app.tool_selection import ToolSelectionMiddleware
+
+    agents = {
+        "full": create_agent(
+            model=model,
+            tools=tools,
+            system_prompt=prompt,
+            middleware=[PrefixCacheMiddleware(tools)],
+        ),
+        "selected": create_agent(
+            model=model,
+            tools=tools,
+            system_prompt=prompt,
+            middleware=[ToolSelectionMiddleware(), PrefixCacheMiddleware(tools)],
+        ),
+    }
+    print(f"{'query':45} {'variant':>8} {'input tok':>9} {'first tool s':>12}")
+    for query in QUERIES:
+        for variant, agent in agents.items():
+            start = time.perf_counter()
+            input_tokens = first_tool = None
+            inputs = {"messages": [{"role": "user", "content": query}]}
+            for chunk in agent.stream(inputs, stream_mode="updates"):
+                message = chunk.get("model", {}).get("messages", [None])[-1]
+                if message is None:
+                    continue
+                if input_tokens is None and message.usage_metadata:
+                    input_tokens = message.usage_metadata["input_tokens"]
+                if message.tool_calls:
+                    first_tool = time.perf_counter() - start
+                    break
+            first = f"{first_tool:.2f}" if first_tool is not None else "-"
+            print(f"{query[:45]:45} {variant:>8} {input_tokens or 0:>9} {first:>12}")
+
+
+if __name__ == "__main__":
+    live() if "--live" in sys.argv else offline()
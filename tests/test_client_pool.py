@@ -0,0 +1,72 @@
+import contextlib
+import threading
+import unittest
+from unittest import mock
+
+from google.auth.exceptions import RefreshError
+
+from app import auth, client_pool
+
+
+class ClientPoolTest(unittest.TestCase):
+    def _get_in_thread(self, pool: client_pool.ClientPool, user_id: str | None):
+        result = {}
+        thread = threading.Thread(
+            target=lambda: result.update(service=pool.get(user_id)), daemon=True
+        )
+        thread.start()
+        thread.join(timeout=5)
+        self.assertFalse(thread.is_alive(), "ClientPool.get deadlocked")
+        return result["service"]
+
+    @contextlib.contextmanager
+    def _new_client_per_build(self):
+        creds = mock.Mock(valid=True)
+        with (
+            mock.patch.object(auth, "_load_credentials", return_value=creds),
+            mock.patch.object(
+                client_pool, "_build_service", side_effect=lambda _: object()
+            ),
+        ):
+            yield
+
+    def test_first_get_builds_client_without_deadlock(self):
+        creds = mock.Mock(valid=True)
+        service = object()
+        with (
+            mock.patch.object(auth, "_load_credentials", return_value=creds),
+            mock.patch.object(client_pool, "_build_service", return_value=service),
+        ):
+            pool = client_pool.ClientPool(2)
+            self.assertIs(self._get_in_thread(pool, "alice"), service)
+            self.assertIs(self._get_in_thread(pool, None), service)
+            self.assertIs(self._get_in_thread(pool, "alice"), service)
+        self.assertEqual(pool.stats()["misses"], 2)
+        self.assertEqual(pool.stats()["hits"], 1)
+
+    def test_revoked_token_drops_the_client(self):
+        with self._new_client_per_build():
+            pool = client_pool.ClientPool(2)
+            first = pool.get("alice")
+            with mock.patch.object(
+                client_pool, "ensure_fresh", side_effect=RefreshError("revoked")
+            ):
+                self.assertRaises(RefreshError, pool.get, "alice")
+            self.assertEqual(pool.stats()["size"], 0)
+            self.assertIsNot(pool.get("alice"), first)
+
+    def test_least_recently_used_client_is_evicted(self):
+        with self._new_client_per_build():
+            pool = client_pool.ClientPool(2)
+            alice = pool.get("alice")
+            pool.get("bob")
+            pool.get("alice")
+            pool.get("carol")
+            self.assertIs(pool.get("alice"), alice)
+        stats = pool.stats()
+        self.assertEqual(stats["evictions"], 1)
+        self.assertEqual(stats["size"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+import threading
+import time
+import unittest
+
+from app.executor import ToolExecutor
+
+
+class ToolExecutorTest(unittest.TestCase):
+    def setUp(self):
+        self.release = threading.Event()
+        self.executor = ToolExecutor(4, 0.5, {"create_calendar_event": 1})
+
+    def tearDown(self):
+        self.release.set()
+        self.executor.shutdown()
+
+    def _blocking_tool(self):
+        release = self.release
+
+        def create_calendar_event(summary: str) -> str:
+            release.wait(5)
+            return f"Created {summary}"
+
+        return create_calendar_event
+
+    def test_slot_wait_counts_against_the_timeout(self):
+        release = self.release
+
+        def create_calendar_event(summary: str) -> str:
+            # The first call frees its slot after 0.3 s, the second never ends.
+            release.wait(0.3 if summary == "first" else 5)
+            return f"Created {summary}"
+
+        start = time.monotonic()
+        self.executor.submit(create_calendar_event, "first")
+        self.executor.call(create_calendar_event, "second")
+        self.assertLess(time.monotonic() - start, 0.7)
+
+    def test_call_that_never_started_is_safe_to_retry(self):
+        tool = self._blocking_tool()
+        self.executor.submit(tool, "first")
+        result = self.executor.call(tool, "second")
+        self.assertIn("did not run, so it is safe to retry", result)
+
+    def test_started_write_is_not_retried(self):
+        tool = self._blocking_tool()
+        result = self.executor.call(tool, "first")
+        self.assertIn("Do not retry it", result)
+
+
+if __name__ == "__main__":
+    unittest.main()
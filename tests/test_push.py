@@ -0,0 +1,125 @@
+import dataclasses
+import datetime
+import threading
+import time
+import unittest
+from unittest import mock
+
+from app import prefetch, push
+from app.prefetch import CLOCK_SKEW, apply_changes, changed_events
+from app.push import FakeNotifier, NotificationReceiver, PushManager
+
+
+class PushPipelineTest(unittest.TestCase):
+    def setUp(self):
+        debounce = mock.patch.object(push, "DEBOUNCE", 0.2)
+        debounce.start()
+        self.addCleanup(debounce.stop)
+        self.manager = PushManager(None, 3600, 60.0)
+        self.refreshed: list[str] = []
+        self.refresh_done = threading.Event()
+        self.manager.on_change(self._on_change)
+        self.receiver = NotificationReceiver(self.manager, "127.0.0.1", 0)
+        self.receiver.start()
+        self.manager.start()
+        self.notifier = FakeNotifier(self.manager, self.receiver.url)
+
+    def tearDown(self):
+        # Closing the fake channels would call the API.
+        with mock.patch.object(push, "get_service"):
+            self.manager.stop()
+        self.receiver.stop()
+
+    def _on_change(self, calendar_id: str):
+        self.refreshed.append(calendar_id)
+        self.refresh_done.set()
+
+    def test_burst_refreshes_only_the_affected_calendar_once(self):
+        work = self.notifier.open_channel("work")
+        self.notifier.open_channel("primary")
+        for _ in range(3):
+            self.assertEqual(self.notifier.notify(work), 200)
+        self.assertTrue(self.refresh_done.wait(5))
+        # Give a second refresh, which there shouldn't be, time to happen.
+        time.sleep(0.5)
+        self.assertEqual(self.refreshed, ["work"])
+        stats = self.manager.stats()
+        self.assertEqual(stats["channels"], 2)
+        self.assertEqual(stats["notifications"], 3)
+        self.assertEqual(stats["refreshes"], 1)
+
+    def test_sync_messages_do_not_refresh(self):
+        channel = self.notifier.open_channel("work")
+        self.assertEqual(self.notifier.notify(channel, "sync"), 200)
+        self.assertFalse(self.refresh_done.wait(0.5))
+        self.assertEqual(self.manager.stats()["notifications"], 0)
+
+    def test_notifications_from_other_channels_are_rejected(self):
+        channel = self.notifier.open_channel("work")
+        for forged in [
+            dataclasses.replace(channel, token="wrong"),
+            dataclasses.replace(channel, resource_id="wrong"),
+            dataclasses.replace(channel, id="unknown"),
+        ]:
+            self.assertEqual(self.notifier.notify(forged), 403)
+        self.assertFalse(self.refresh_done.wait(0.5))
+        self.assertEqual(self.manager.stats()["notifications"], 0)
+
+
+def _event(event_id: str, start: datetime.datetime, **fields) -> dict:
+    end = start + datetime.timedelta(hours=1)
+    return {
+        "id": event_id,
+        "start": {"dateTime": start.isoformat()},
+        "end": {"dateTime": end.isoformat()},
+        **fields,
+    }
+
+
+class ApplyChangesTest(unittest.TestCase):
+    def setUp(self):
+        self.start = datetime.datetime(2026, 1, 5, tzinfo=datetime.UTC)
+        self.end = self.start + datetime.timedelta(days=7)
+        self.events = [
+            _event("a", self.start + datetime.timedelta(days=1)),
+            _event("b", self.start + datetime.timedelta(days=2)),
+        ]
+
+    def _apply(self, changes: list[dict]) -> list[dict] | None:
+        return apply_changes(self.events, changes, self.start, self.end)
+
+    def test_cancelled_events_are_removed(self):
+        events = self._apply([{"id": "a", "status": "cancelled"}])
+        self.assertEqual([event["id"] for event in events], ["b"])
+
+    def test_events_moved_out_of_the_window_are_removed(self):
+        moved = _event("b", self.end + datetime.timedelta(days=1))
+        events = self._apply([moved])
+        self.assertEqual([event["id"] for event in events], ["a"])
+
+    def test_new_and_moved_events_are_kept_in_start_order(self):
+        changes = [
+            _event("c", self.start + datetime.timedelta(hours=1)),
+            _event("a", self.start + datetime.timedelta(days=3)),
+        ]
+        events = self._apply(changes)
+        self.assertEqual([event["id"] for event in events], ["c", "b", "a"])
+
+    def test_changed_recurring_series_needs_a_full_fetch(self):
+        series = _event("d", self.start, recurrence=["RRULE:FREQ=DAILY"])
+        self.assertIsNone(self._apply([series]))
+
+    def test_changed_events_asks_for_changes_since_the_last_fetch(self):
+        since = self.start.timestamp()
+        with mock.patch.object(prefetch, "iter_events", return_value=iter([])) as fetch:
+            self.assertEqual(changed_events("work", since), [])
+        kwargs = fetch.call_args.kwargs
+        self.assertEqual(fetch.call_args.args, ("work",))
+        self.assertEqual(kwargs["updated_min"].timestamp(), since - CLOCK_SKEW)
+        self.assertTrue(kwargs["show_deleted"])
+        self.assertFalse(kwargs["single_events"])
+        self.assertTrue(kwargs["raise_errors"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+import datetime
+import json
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from app.search_index import EventIndex, SearchIndex
+
+
+def _event(summary: str, days: int = 1) -> dict:
+    start = datetime.datetime.now(tz=datetime.UTC) + datetime.timedelta(days=days)
+    end = start + datetime.timedelta(hours=1)
+    return {
+        "summary": summary,
+        "start": {"dateTime": start.isoformat()},
+        "end": {"dateTime": end.isoformat()},
+    }
+
+
+class SearchIndexTest(unittest.TestCase):
+    def setUp(self):
+        now = datetime.datetime.now(tz=datetime.UTC)
+        events = [_event("Design review"), _event("standup retro"), _event("Lunch")]
+        self.index = SearchIndex(
+            events, now - datetime.timedelta(days=1), now + datetime.timedelta(days=30), 0
+        )
+
+    def _titles(self, query: str) -> list[str]:
+        return [event["summary"] for event in self.index.search(query)]
+
+    def test_transposed_letters_match(self):
+        self.assertEqual(self._titles("desgin reveiw"), ["Design review"])
+        self.assertEqual(self._titles("standpu"), ["standup retro"])
+
+    def test_unrelated_words_do_not_match(self):
+        self.assertEqual(self._titles("desk"), [])
+
+
+    def test_saved_index_answers_like_the_built_one(self):
+        loaded = SearchIndex.from_json(json.loads(json.dumps(self.index.to_json())))
+        for query in ["desgin reveiw", "stand", "lunch", "desk"]:
+            self.assertEqual(loaded.search(query), self.index.search(query))
+
+    def test_only_the_requested_calendar_is_loaded(self):
+        self.index.built_at = time.time()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "index.json"
+            entry = self.index.to_json()
+            path.write_text(json.dumps({"primary": entry, "work": entry}))
+            index = EventIndex(path, 30, 30, 3600)
+            self.assertEqual(len(index.search("review")), 1)
+            self.assertEqual(list(index._indexes), ["primary"])
+
+
+if __name__ == "__main__":
+    unittest.main()
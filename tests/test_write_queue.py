@@ -0,0 +1,139 @@
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from app import write_queue
+
+
+class FakeEvents:
+    def insert(self, **kwargs):
+        return ("insert", kwargs)
+
+    def patch(self, **kwargs):
+        return ("patch", kwargs)
+
+    def delete(self, **kwargs):
+        return ("delete", kwargs)
+
+
+class FakeBatch:
+    def __init__(self, callback, sent: list):
+        self.callback = callback
+        self.sent = sent
+        self.request_ids: list[str] = []
+
+    def add(self, call, request_id: str):
+        self.request_ids.append(request_id)
+        self.sent.append(call)
+
+    def execute(self):
+        for request_id in self.request_ids:
+            self.callback(request_id, {"id": f"event-{request_id}"}, None)
+
+
+class FakeService:
+    """Records the requests of each batch and answers them all successfully."""
+
+    def __init__(self):
+        self.sent: list[tuple] = []
+
+    def events(self):
+        return FakeEvents()
+
+    def new_batch_http_request(self, callback):
+        return FakeBatch(callback, self.sent)
+
+
+class WriteQueueTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.queue = write_queue.WriteQueue(Path(tmp.name) / "queue.db", 10, 60.0)
+        self.service = FakeService()
+
+    def _flush(self) -> list[tuple]:
+        with mock.patch.object(write_queue, "get_service", return_value=self.service):
+            self.queue.flush()
+        sent, self.service.sent = self.service.sent, []
+        return sent
+
+    def test_updates_are_merged_into_one_patch(self):
+        self.queue.update("abc", {"summary": "Standup"})
+        self.queue.update("abc", {"location": "Room 1"})
+        self.assertEqual(
+            self._flush(),
+            [
+                (
+                    "patch",
+                    {
+                        "calendarId": "primary",
+                        "eventId": "abc",
+                        "body": {"summary": "Standup", "location": "Room 1"},
+                    },
+                )
+            ],
+        )
+
+    def test_update_of_a_queued_create_is_folded_into_the_insert(self):
+        local_id = self.queue.create({"summary": "Standup"})
+        self.queue.update(local_id, {"location": "Room 1"})
+        self.assertEqual(
+            self._flush(),
+            [
+                (
+                    "insert",
+                    {
+                        "calendarId": "primary",
+                        "body": {"summary": "Standup", "location": "Room 1"},
+                    },
+                )
+            ],
+        )
+
+    def test_deleting_a_queued_create_cancels_both(self):
+        local_id = self.queue.create({"summary": "Standup"})
+        self.queue.delete(local_id)
+        self.assertEqual(self.queue.pending(), 0)
+        self.assertEqual(self._flush(), [])
+
+    def test_update_after_a_queued_delete_is_refused(self):
+        self.queue.delete("abc")
+        with self.assertRaises(ValueError):
+            self.queue.update("abc", {"summary": "Standup"})
+        self.assertEqual(
+            self._flush(), [("delete", {"calendarId": "primary", "eventId": "abc"})]
+        )
+
+    def test_local_id_resolves_to_the_created_event(self):
+        local_id = self.queue.create({"summary": "Standup"})
+        [(op, _)] = self._flush()
+        self.assertEqual(op, "insert")
+        event_id = self.queue.resolve(local_id)
+        self.assertFalse(event_id.startswith(write_queue.LOCAL_ID_PREFIX))
+        self.queue.update(local_id, {"location": "Room 1"})
+        self.assertEqual(
+            self._flush(),
+            [
+                (
+                    "patch",
+                    {
+                        "calendarId": "primary",
+                        "eventId": event_id,
+                        "body": {"location": "Room 1"},
+                    },
+                )
+            ],
+        )
+
+    def test_flush_notifies_changed_calendars(self):
+        changed = []
+        self.queue.on_write(changed.append)
+        self.queue.create({"summary": "Standup"}, "work")
+        self.queue.delete("abc", "primary")
+        self.assertEqual(len(self._flush()), 2)
+        self.assertEqual(sorted(changed), ["primary", "work"])
+
+
+if __name__ == "__main__":
+    unittest.main()